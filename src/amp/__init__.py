@@ -1,4 +1,5 @@
 from .amp import AbstractAmp, TelnetAmp
-from .amp_discovery import discover_amp, check_amp
+from .amp_discovery import discover_amp, check_amp, is_amp, invalidate_cache
 from .amp_controller import AmpController
+from .reconciler import Reconciler
 
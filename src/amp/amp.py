@@ -26,10 +26,9 @@ class AbstractAmp(AbstractProtocol):
     def on_stop_playing(self):
         with self._soundMixinLock:
             if self._idle_timer and self._idle_timer.is_alive(): return
-            try: timeout = config.getfloat("Amp","poweroff_after")*60
-            except ValueError: return
+            timeout = config.snapshot.poweroff_after
             if not timeout: return
-            self._idle_timer = Timer(timeout, self.on_idle)
+            self._idle_timer = Timer(timeout*60, self.on_idle)
             self._idle_timer.start()
     
     @log_call
@@ -3,9 +3,11 @@ Connects system events to the amp.
 Main class AmpController
 """
 
+import sys, socket
 from ..core.util.system_events import SystemEvents
-from ..core.util import log_call
+from ..core.util import log_call, ssdp
 from ..core import config, features
+from .amp_discovery import move_cache
 
 
 class _Base(SystemEvents):
@@ -67,9 +69,47 @@ class KeepConnected(_Base):
     def on_resume(self):
         """ Is being executed after resume computer from suspension """
         self.amp.enter()
+        self.amp.reconnect_now()
         super().on_resume()
 
 
+class SSDPReconnect(_Base):
+    """ Reconnect immediately when the amp announces itself on the network.
+    Devices that have been seen on the amp's host are being recognised by their USN,
+    so that the amp is being followed to a new address """
+
+    def __init__(self, *args, **xargs):
+        super().__init__(*args, **xargs)
+        self._amp_usns = set()
+        self._tracker = ssdp.Tracker()
+        self._tracker.bind(
+            on_alive = self.on_ssdp_device,
+            on_change = lambda device, old: self.on_ssdp_device(device))
+        try: self._tracker.start()
+        except OSError as e: print("[%s] %s"%(self.__class__.__name__, repr(e)), file=sys.stderr)
+
+    def _is_amp_host(self, host):
+        amp_host = getattr(self.amp, "host", None)
+        if host == amp_host: return True
+        try: return host == socket.gethostbyname(amp_host)
+        except (OSError, TypeError): return False
+
+    def on_ssdp_device(self, device):
+        if self._is_amp_host(device.host): self._amp_usns.add(device.usn)
+        elif device.usn in self._amp_usns: self.on_amp_moved(device.host)
+        else: return
+        if not self.amp.connected: self.amp.reconnect_now()
+
+    def on_amp_moved(self, host):
+        """ the amp has got the new address @host """
+        old = self.amp.host
+        if self.verbose > 0: print("[%s] Amp moved from %s to %s"
+            %(self.__class__.__name__, old, host), file=sys.stderr)
+        self.amp.host = host
+        move_cache(old, host)
+        if self.amp.connected: self.amp.on_disconnected() # the old address is gone
+
+
 class AutoPower(_Base):
     """ implementing actions for automatic power management """
     
@@ -90,7 +130,7 @@ class AutoPower(_Base):
         super().on_suspend()
 
 
-class AmpController(AutoPower, KeepConnected, SoundMixin, _Base):
+class AmpController(AutoPower, SSDPReconnect, KeepConnected, SoundMixin, _Base):
     """
     Adds system events listener. Keep amp connected whenever possible
     Features: Auto power, auto reconnecting, 
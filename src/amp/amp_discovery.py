@@ -1,27 +1,113 @@
-import socket
+import socket, time, json, os, sys
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Thread
 from urllib.parse import urlparse
 from ..core.util import ssdp
-from .. import Amp
+from ..core.config import config, CONFDIR
 
 
-def check_amp(host):
+CACHE_FILE = os.path.join(CONFDIR, "discovery.json")
+PROBE_TIMEOUT = 1.5 # seconds
+CACHE_CHECK_TIMEOUT = .5 # seconds for re-checking a cached amp
+MAX_PROBES = 8 # concurrent probes
+
+
+def check_amp(host, port=23, timeout=PROBE_TIMEOUT):
+    """
+    Probe @host for a Denon compatible amp by asking for its name and power state.
+    Returns amp details or False if the host did not answer within @timeout seconds.
+    """
+    deadline = time.monotonic()+timeout
+    name = None
+    power = False
     try:
-        with Amp(protocol=".denon", host=host, port=23) as amp:
-            name = amp.name
-    except (ConnectionError, socket.timeout, socket.gaierror, socket.herror, OSError):
-        return False
-    print("Found %s on %s."%(name, host))
-    return dict(host=host,port=23,protocol=".denon")
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.sendall(b"NSFRN ?\rPW?\r")
+            buf = b""
+            while not name and (remaining := deadline-time.monotonic()) > 0:
+                sock.settimeout(remaining)
+                data = sock.recv(1024)
+                if not data: break
+                *lines, buf = (buf+data).split(b"\r")
+                for line in lines:
+                    line = line.strip().decode(errors="replace")
+                    if line.startswith("NSFRN "): name = line[len("NSFRN "):].strip()
+                    elif line.startswith("PW"): power = True
+    except OSError: pass
+    if not name and not power: return False
+    print("Found %s on %s."%(name or "amp", host))
+    return dict(host=host, port=port, protocol=".denon", name=name or host)
+
 
+def _read_cache():
+    try:
+        with open(CACHE_FILE) as fp: d = json.load(fp)
+    except (OSError, ValueError): return None
+    if time.time()-d.get("time", 0) > config.getfloat("Target", "discovery_cache_ttl"): return None
+    return d.get("amp")
 
-def discover_amp():
+
+def _write_cache(amp_details):
+    try:
+        with open(CACHE_FILE, "w") as fp: json.dump(dict(time=time.time(), amp=amp_details), fp)
+    except OSError as e: print("ERROR writing %s: %s"%(CACHE_FILE, repr(e)), file=sys.stderr)
+
+
+def move_cache(old_host, new_host):
+    """ update the cached amp's address if it was on @old_host """
+    try:
+        with open(CACHE_FILE) as fp: d = json.load(fp)
+    except (OSError, ValueError): return
+    if d.get("amp", {}).get("host") != old_host: return
+    d["amp"]["host"] = new_host
+    _write_cache(d["amp"])
+
+
+def invalidate_cache(host=None):
+    """ forget the cached amp if it is on @host or if @host is None """
+    amp_details = _read_cache()
+    if not amp_details or host is not None and amp_details.get("host") != host: return
+    try: os.remove(CACHE_FILE)
+    except FileNotFoundError: pass
+    except OSError as e: print("ERROR removing %s: %s"%(CACHE_FILE, repr(e)), file=sys.stderr)
+
+
+def is_amp(response):
+    """ @response: ssdp.SSDPResponse or ssdp.Device """
+    return "denon" in response.st.lower() or "marantz" in response.st.lower()
+
+
+def discover_amp(cache=True):
     """
-    Search local network for Denon amp
+    Search local network for Denon amp. Candidates are being probed concurrently
+    and the first amp that answers is returned.
+    @cache bool: Return a previously discovered amp if it is younger than Target.discovery_cache_ttl
+        and still answers
     """
-    for response in ssdp.discover():
-        if "denon" in response.st.lower() or "marantz" in response.st.lower():
-            host = urlparse(response.location).hostname
-            if amp_details := check_amp(host): return amp_details
-    raise Exception("No Denon amp found. Check if amp is connected or"
-        " set IP manually.")
+    if cache and (amp_details := _read_cache()):
+        if check_amp(amp_details["host"], amp_details.get("port", 23), CACHE_CHECK_TIMEOUT):
+            return amp_details
+        invalidate_cache(amp_details["host"])
+    found = Queue()
+
+    def probe(host):
+        if amp_details := check_amp(host): found.put(amp_details)
 
+    def search():
+        hosts = set()
+        with ThreadPoolExecutor(max_workers=MAX_PROBES) as pool:
+            for response in ssdp.discover():
+                if is_amp(response):
+                    host = urlparse(response.location).hostname
+                    if host in hosts: continue
+                    hosts.add(host)
+                    pool.submit(probe, host)
+        found.put(None)
+
+    Thread(target=search, name="discover_amp", daemon=True).start()
+    amp_details = found.get()
+    if not amp_details: raise Exception("No Denon amp found. Check if amp is connected or"
+        " set IP manually.")
+    _write_cache(amp_details)
+    return amp_details
@@ -0,0 +1,122 @@
+"""
+Keeps features of an amp at a desired state.
+Example:
+    r = Reconciler(amp)
+    r.set("source", "CD", policy=DELAY, delay=30)
+    r.set("volume", Decimal(40), policy=OBSERVE)
+    r.bind(on_drift=lambda key, value, target: print(key, value))
+"""
+
+import sys, time
+from collections import deque
+from threading import Timer, Lock
+from ..core.util import Bindable
+
+
+ENFORCE = "enforce" # restore target immediately
+OBSERVE = "observe" # only call on_drift
+DELAY = "delay" # restore target if still differing after @delay seconds
+
+
+class Target:
+
+    def __init__(self, value, policy=ENFORCE, delay=0):
+        if policy not in (ENFORCE, OBSERVE, DELAY): raise ValueError("Unknown policy %s"%policy)
+        self.value = value
+        self.policy = policy
+        self.delay = delay
+        self.timer = None
+        self.corrections = deque() # time of each correction
+
+    def cancel(self):
+        if self.timer: self.timer.cancel()
+        self.timer = None
+
+
+class Reconciler(Bindable):
+    """
+    Restores feature values on amp's push events according to each feature's policy.
+    At most @max_corrections corrections per feature are being sent within @rate_window seconds.
+    """
+    max_corrections = 3
+    rate_window = 60
+
+    def __init__(self, amp, verbose=0):
+        super().__init__()
+        self.amp = amp
+        self.verbose = verbose
+        self._targets = {}
+        self._lock = Lock()
+        self.amp.bind(
+            on_feature_change = self.on_feature_change,
+            on_disconnected = self.on_amp_disconnected)
+
+    def set(self, key, value, policy=ENFORCE, delay=0):
+        """ desired @value for feature @key """
+        f = self.amp.features[key]
+        with self._lock:
+            if key in self._targets: self._targets[key].cancel()
+            self._targets[key] = Target(value, policy, delay)
+        self.amp.preload_features.add(key)
+        if self.amp.connected:
+            if f.isset(): self.check(key, f.get())
+            else: f.async_poll()
+
+    def remove(self, key):
+        with self._lock:
+            target = self._targets.pop(key, None)
+            if target: target.cancel()
+
+    def on_feature_change(self, key, value, prev): # bound to amp
+        if key in self._targets: self.check(key, value)
+
+    def on_amp_disconnected(self):
+        with self._lock:
+            for target in self._targets.values(): target.cancel()
+
+    def _differs(self, key, value):
+        f = self.amp.features[key]
+        target = self._targets[key].value
+        try: return f.encode(value) != f.encode(target)
+        except Exception: return value != target
+
+    def check(self, key, value):
+        with self._lock:
+            target = self._targets.get(key)
+            if not target: return
+            if not self._differs(key, value): return target.cancel()
+            if target.policy == DELAY and not target.timer:
+                target.timer = Timer(target.delay, self._delayed_correct, args=(key, target))
+                target.timer.start()
+        self.on_drift(key, value, target.value)
+        if target.policy == ENFORCE: self.correct(key)
+
+    def _delayed_correct(self, key, target):
+        with self._lock:
+            if self._targets.get(key) is not target: return
+            target.timer = None
+        f = self.amp.features[key]
+        if f.isset() and self._differs(key, f.get()): self.correct(key)
+
+    def correct(self, key):
+        """ send target value of @key unless rate limit has been reached """
+        with self._lock:
+            target = self._targets.get(key)
+            if not target: return
+            now = time.monotonic()
+            while target.corrections and target.corrections[0] < now-self.rate_window:
+                target.corrections.popleft()
+            if len(target.corrections) >= self.max_corrections:
+                if self.verbose > 0: print("[%s] Rate limit reached for %s"
+                    %(self.__class__.__name__, key), file=sys.stderr)
+                return
+            target.corrections.append(now)
+        if self.verbose > 1: print("[%s] Restoring %s = %s"
+            %(self.__class__.__name__, key, repr(target.value)), file=sys.stderr)
+        try: self.amp.features[key].send(target.value)
+        except ConnectionError as e: print("[%s] %s"%(self.__class__.__name__, repr(e)), file=sys.stderr)
+
+    def on_drift(self, key, value, target):
+        """ Event: feature @key has changed to @value that differs from @target """
+        pass
+
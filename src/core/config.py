@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*- 
 
-import os, configparser, pkgutil, json
+import sys, os, configparser, pkgutil, json, tempfile, atexit, io, signal, time
 from collections import UserDict
+from contextlib import suppress
+from threading import Lock, Timer
 from decimal import Decimal
+from .util.function_bind import Bindable
 from ..info import PKG_NAME
 
 
@@ -10,6 +13,87 @@ CONFDIR = os.path.expanduser("~/.%s"%PKG_NAME)
 FILE = os.path.join(CONFDIR, "main.cfg")
 
 
+def atomic_write(path, data):
+    """ Write str @data to @path via a temporary file so that @path is never left truncated """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".%s."%os.path.basename(path))
+    try:
+        with open(fd, "w") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, path)
+    except:
+        with suppress(OSError): os.remove(tmp)
+        raise
+
+
+class WriteBehindMixin:
+    """ save() marks the object as modified. It will be written once after @save_delay
+    seconds without further modifications, at exit or on flush_all(). """
+    save_delay = .5 # seconds
+    _instances = []
+
+    def __init__(self, *args, **xargs):
+        self._save_lock = Lock()
+        self._write_lock = Lock()
+        self._save_timer = None
+        super().__init__(*args, **xargs)
+        WriteBehindMixin._instances.append(self)
+
+    def _dump(self):
+        """ returns the file content """
+        raise NotImplementedError()
+
+    def _get_path(self): raise NotImplementedError()
+
+    def save(self):
+        with self._save_lock:
+            if self._save_timer: self._save_timer.cancel()
+            self._save_timer = Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self, blocking=True):
+        """ write pending modifications now. save() does not wait for the disk meanwhile.
+        With blocking=False, e.g. in a signal handler, busy locks are being skipped """
+        if not self._write_lock.acquire(blocking): return self._flush_unlocked()
+        try: # keeps the order of writes
+            if not self._save_lock.acquire(blocking): return self._flush_unlocked()
+            try:
+                if not self._save_timer: return
+                self._save_timer.cancel()
+                self._save_timer = None
+                path, data = self._get_path(), self._dump()
+            finally: self._save_lock.release()
+            atomic_write(path, data)
+        finally: self._write_lock.release()
+
+    def _flush_unlocked(self):
+        """ last resort when the locks are being held by the interrupted thread """
+        if self._save_timer: atomic_write(self._get_path(), self._dump())
+
+
+def flush_all(blocking=True):
+    """ write pending modifications of all config objects. Call before os._exit() """
+    for obj in WriteBehindMixin._instances:
+        try: obj.flush(blocking)
+        except Exception as e: print("ERROR writing %s: %s"%(obj._get_path(), repr(e)), file=sys.stderr)
+
+
+def install_sigterm_handler():
+    """ Flush config files on SIGTERM, then call the previous handler. Call from main thread """
+    previous = signal.getsignal(signal.SIGTERM)
+    def on_sigterm(sig, frame):
+        flush_all(blocking=False)
+        if callable(previous): return previous(sig, frame)
+        signal.signal(sig, signal.SIG_DFL)
+        os.kill(os.getpid(), sig)
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+atexit.register(flush_all)
+
+
 class ExtendedConfigParser(configparser.ConfigParser):
     
     def __init__(self,*args,**xargs):
@@ -34,7 +118,7 @@ class ExtendedConfigParser(configparser.ConfigParser):
         self[section][option] = json.dumps(value)
 
 
-class ConfigDiffMixin:
+class ConfigDiffMixin(WriteBehindMixin):
     """ Append modified values to @local_path """
     
     def __init__(self,local_path,*args,**xargs):
@@ -55,48 +139,136 @@ class ConfigDiffMixin:
         self._local.set(section, *args, **xargs)
         self.save()
     
-    def save(self):
-        with open(self._local_path,"w") as f:
+    def _get_path(self): return self._local_path
+
+    def _dump(self):
+        with io.StringIO() as f:
             self._local.write(f)
+            return f.getvalue()
+
+
+class Snapshot:
+    """ Typed values for hot paths, computed once per config change """
+
+    def __init__(self, config):
+        self.fallback_feature = config.getboolean("Target","fallback_feature")
+        try: self.poweroff_after = config.getfloat("Amp","poweroff_after")
+        except ValueError: self.poweroff_after = None
+        self.volume = config.get("Amp","volume_feature_key")
+        self.muted = config.get("Amp","muted_feature_key")
+        self.power = config.get("Amp","power_feature_key")
+        self.source = config.get("Amp","source_feature_key")
+
+
+class SnapshotMixin(Bindable):
+    """ Provides config.snapshot. It is being renewed after set() or reading a file """
+    _snapshot = None
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None: snapshot = self._snapshot = Snapshot(self)
+        return snapshot
+
+    def set(self, *args, **xargs):
+        super().set(*args, **xargs)
+        self.invalidate()
+
+    def read(self, *args, **xargs):
+        try: return super().read(*args, **xargs)
+        finally: self.invalidate()
+
+    def read_file(self, *args, **xargs):
+        try: return super().read_file(*args, **xargs)
+        finally: self.invalidate()
+
+    def invalidate(self):
+        self._snapshot = None
+        self.on_change()
+
+    def on_change(self):
+        """ Event that is being fired when the config has changed """
+        pass
 
 
 class ShortcutsMixin:
-    volume = property(lambda self: self.get("Amp","volume_feature_key"))
-    muted = property(lambda self: self.get("Amp","muted_feature_key"))
-    power = property(lambda self: self.get("Amp","power_feature_key"))
-    source = property(lambda self: self.get("Amp","source_feature_key"))
+    volume = property(lambda self: self.snapshot.volume)
+    muted = property(lambda self: self.snapshot.muted)
+    power = property(lambda self: self.snapshot.power)
+    source = property(lambda self: self.snapshot.source)
+
+
+class ConfigParser(ShortcutsMixin, SnapshotMixin, ConfigDiffMixin, ExtendedConfigParser):
+    """ Reading config.snapshot reloads the file at most every @check_interval seconds
+    if another process has changed it """
+    check_interval = 2
+    _mtime = None
+    _next_check = 0
+
+    @property
+    def snapshot(self):
+        if time.monotonic() > self._next_check: self.check_file()
+        return super().snapshot
 
+    def _get_mtime(self):
+        try: return os.stat(self._local_path).st_mtime_ns
+        except OSError: return None
 
-class ConfigParser(ShortcutsMixin, ConfigDiffMixin, ExtendedConfigParser): pass
+    def check_file(self):
+        """ reload if the file has been changed since it was read or written """
+        self._next_check = time.monotonic()+self.check_interval
+        if self._get_mtime() != self._mtime: self.reload()
 
+    def flush(self, *args, **xargs):
+        try: return super().flush(*args, **xargs)
+        finally: self._mtime = self._get_mtime()
 
-class ConfigDict(UserDict):
+    def reload(self):
+        """ Read the config files again, e.g. after another process changed them.
+        Values are being replaced in place, so that other threads never see a missing option """
+        self.flush()
+        fresh = ExtendedConfigParser()
+        fresh.read_string(default)
+        fresh.read([self._local_path])
+        local = ExtendedConfigParser()
+        local.read([self._local_path])
+        self._local = local
+        for section in fresh.sections():
+            if not self.has_section(section): self.add_section(section)
+            for option, value in fresh.items(section, raw=True):
+                if self.get(section, option, raw=True, fallback=None) != value:
+                    ExtendedConfigParser.set(self, section, option, value)
+            for option in set(self[section])-set(fresh[section]): self.remove_option(section, option)
+        self.invalidate()
+
+
+class ConfigDict(WriteBehindMixin, UserDict):
     
     def __init__(self, filename):
+        super().__init__()
         self._filename = filename
-        if isinstance(filename, dict): return super().__init__(filename)
+        if isinstance(filename, dict): return self.data.update(filename)
         try:
             with open(os.path.join(CONFDIR, filename)) as fp:
-                return super().__init__(json.load(fp))
+                return self.data.update(json.load(fp))
         except FileNotFoundError:
             try:
                 dct = json.loads(pkgutil.get_data(__name__,"../share/%s.default"%filename).decode())
-                return super().__init__(dct)
+                return self.data.update(dct)
             except FileNotFoundError as e: raise #super().__init__()
     
     def __setitem__(self, *args, **xargs):
         super().__setitem__(*args, **xargs)
         self.save()
     
-    def save(self):
-        with open(os.path.join(CONFDIR, self._filename),"w") as fp:
-            json.dump(dict(self), fp)
+    def _get_path(self): return os.path.join(CONFDIR, self._filename)
+
+    def _dump(self): return json.dumps(dict(self))
 
 
 try: os.mkdir(CONFDIR)
 except OSError: pass
 default = pkgutil.get_data(__name__,"../share/main.cfg.default").decode()
 config = ConfigParser(FILE)
-config.read_string(default)
-config.read([FILE])
+config.reload()
 
@@ -4,13 +4,16 @@ values from a Telnet or non-Telnet server. A client supports features. See featu
 """
 
 import sys
-from threading import Thread, Event
+from contextlib import suppress
+from threading import Thread, Event, Lock
 from ..util.function_bind import Bindable
 from ..util import log_call, AttrDict
 from ..config import config
 from ..config import FILE as CONFFILE
 from .protocol_type import ProtocolType
 from . import features
+from .scene import _ScenesMixin
+from .scheduler import INTERACTIVE, AWAITED, BACKGROUND
 
 
 class ProtocolBase(Bindable, ProtocolType):
@@ -83,6 +86,15 @@ class ProtocolBase(Bindable, ProtocolType):
         return add(Feature) if Feature else add
     
     def poll_feature(self, f, *args, **xargs): raise NotImplementedError()
+
+    def call_timeout(self, f=None):
+        """ seconds to wait for an answer to feature @f """
+        if f is not None and f.timeout is not None: return f.timeout
+        return features.MAX_CALL_DELAY
+
+    def quiet_time(self):
+        """ seconds without further answers after which the server has finished answering """
+        return self.call_timeout()/4
     
     @log_call
     def on_feature_change(self, key, value, previous_val):
@@ -106,13 +118,13 @@ class Fallback(features.SelectFeature):
     def send(self, *args, **xargs): raise ValueError("Cannot set value!")
     def resend(self, *args, **xargs): pass
     def async_poll(self, *args, **xargs): pass
-    def isset(self): return super().isset() and config.getboolean("Target","fallback_feature")
+    def isset(self): return super().isset() and config.snapshot.fallback_feature
 
     def consume(self, data):
         self._val = data
         if self.amp.verbose > 1:
             print("[%s] WARNING: could not parse `%s`"%(self.__class__.__name__, data))
-        if config.getboolean("Target","fallback_feature"): self.on_change(None, data)
+        if config.snapshot.fallback_feature: self.on_change(None, data)
 
 
 @ProtocolBase.add_feature
@@ -154,17 +166,32 @@ class AbstractServer(ProtocolBase):
 
 class _FeaturesMixin:
     _polled = list
+    _default_features = () # features with a default_value
     preload_features = set() # feature keys to be polled on_connect
 
     def __init__(self, *args, **xargs):
         super().__init__(*args, **xargs)
         self.preload_features = self.preload_features.copy()
         self._polled = self._polled()
+        self._default_features = tuple(
+            f for f in self.features.values() if f.default_value is not None and f.call)
+
+    poll_lock_metrics = property(lambda self: {
+        key: f.poll_lock_wait for key, f in self.features.items()
+        if getattr(f, "poll_lock_wait", None) and f.poll_lock_wait.count},
+        doc="waits for a feature's poll lock on get() per feature")
 
     def on_connect(self):
         super().on_connect()
         for key in set(self.preload_features):
-            if key in self.features: self.features[key].async_poll()
+            if key in self.features: self.features[key].async_poll(priority=BACKGROUND)
+
+    def on_receive_raw_data(self, data):
+        super().on_receive_raw_data(data)
+        # features waiting for their default value resolve shortly after related answers stop
+        for f in self._default_features:
+            if not f.isset() and f.call in self._polled and data.startswith(f.call.rstrip("? ")):
+                f.await_default(self.quiet_time())
 
     def on_disconnected(self):
         super().on_disconnected()
@@ -176,11 +203,92 @@ class _FeaturesMixin:
         super().mainloop_hook()
         for p in self._pending: p.check_expiration()
     
-    def poll_feature(self, f, force=False):
+    def poll_feature(self, f, force=False, priority=BACKGROUND):
         """ poll feature value if not polled before or force is True """
         if f.call in self._polled and not force: return
         self._polled.append(f.call)
-        f.poll_on_client()
+        f.poll_on_client(priority)
+
+
+class PendingQuery:
+    """ A raw answer awaited by query(). Resolves with the first line where matches(line) is True """
+
+    def __init__(self, cmd, matches):
+        self.cmd = cmd
+        self.matches = matches
+        self.response = None
+        self._event = Event()
+        self._cancelled = False
+
+    def __repr__(self): return "<query %s>"%self.cmd
+
+    def resolve(self, data):
+        self.response = data
+        self._event.set()
+
+    def cancel(self):
+        self._cancelled = True
+        self._event.set()
+
+    def wait(self, timeout=features.MAX_CALL_DELAY+.1):
+        if not self._event.wait(timeout) or self._cancelled:
+            raise ConnectionError("Timeout on waiting for answer for %s"%self.cmd)
+        return self.response
+
+
+class _QueriesMixin:
+    """ Keeps a table of pending raw queries that is checked before feature dispatch """
+    _queries = list
+    _queries_lock = None
+
+    def __init__(self, *args, **xargs):
+        super().__init__(*args, **xargs)
+        self._queries = self._queries()
+        self._queries_lock = Lock()
+
+    def async_query(self, cmd, matches=None, priority=AWAITED):
+        """
+        Low level function that sends @cmd and returns a PendingQuery that resolves
+        to the first line where matches(line) is True. Returns None if @matches is None.
+        """
+        if not matches: return self.send(cmd, priority)
+        query = PendingQuery(cmd, matches)
+        with self._queries_lock: self._queries.append(query)
+        try: self.send(cmd, priority)
+        except:
+            self._remove_query(query)
+            raise
+        return query
+
+    def query(self, cmd, matches=None):
+        """
+        Low level function that sends @cmd and returns a value where matches(value) is True.
+        Only called by hifish
+        """
+        query = self.async_query(cmd, matches)
+        return query and query.wait(self.call_timeout()+.1)
+
+    def query_many(self, cmds, matches=None):
+        """ Sends all @cmds at once and returns their answers in the same order """
+        queries = [self.async_query(cmd, matches) for cmd in cmds]
+        return [query and query.wait(self.call_timeout()+.1) for query in queries]
+
+    def _remove_query(self, query):
+        with self._queries_lock:
+            with suppress(ValueError): self._queries.remove(query)
+
+    def on_receive_raw_data(self, data):
+        if self._queries:
+            with self._queries_lock:
+                resolved = [query for query in self._queries if query.matches(data)]
+                for query in resolved: self._queries.remove(query)
+            for query in resolved: query.resolve(data)
+        super().on_receive_raw_data(data)
+
+    def on_disconnected(self):
+        super().on_disconnected()
+        with self._queries_lock: queries, self._queries[:] = self._queries.copy(), []
+        for query in queries: query.cancel()
 
 
 class _AbstractClient(ProtocolBase):
@@ -194,17 +302,21 @@ class _AbstractClient(ProtocolBase):
     _mainloopt = None
     _stoploop = None
     _connectOnEnter = False
+    threaded = True
 
-    def __init__(self, connect=True, *args, **xargs):
+    def __init__(self, connect=True, *args, threaded=True, **xargs):
+        """ @threaded: If False, the caller drives the client, see TelnetClient.process_io() """
         super().__init__(*args, **xargs)
         self._stoploop = Event()
         self._connectOnEnter = connect
+        self.threaded = threaded
     
     def _setfattr(self, key, val): return self.features[key].send(val)
 
     def enter(self):
-        if self._connectOnEnter: self.connect()
         self._stoploop.clear()
+        if self._connectOnEnter: self.connect()
+        if not self.threaded: return self
         self._mainloopt = Thread(target=self.mainloop, name=self.__class__.__name__, daemon=True)
         self._mainloopt.start()
         return self
@@ -212,23 +324,22 @@ class _AbstractClient(ProtocolBase):
     def exit(self):
         self._stoploop.set()
         self.disconnect()
-        self._mainloopt.join()
+        if self._mainloopt: self._mainloopt.join()
         if self.connected: self.on_disconnected()
 
     def connect(self): pass
 
     def disconnect(self): pass
 
-    def query(self, cmd, matches=None):
-        """
-        Low level function that sends @cmd and returns a value where matches(value) is True.
-        Only called by hifish
-        """
-        raise NotImplementedError()
+    def reconnect_now(self):
+        """ try to reconnect immediately if disconnected """
+        pass
+
+    def query(self, cmd, matches=None): raise NotImplementedError()
 
     __call__ = lambda self,*args,**xargs: self.query(*args,**xargs)
         
-    def send(self, cmd):
+    def send(self, cmd, priority=INTERACTIVE):
         if self.verbose > 4: print("%s $ %s"%(self.prompt, cmd), file=sys.stderr)
 
     @log_call
@@ -241,6 +352,10 @@ class _AbstractClient(ProtocolBase):
     @log_call
     def on_disconnected(self): self.connected = False
 
+    def on_connect_failed(self, e):
+        """ Event: Connecting to the server failed with ConnectionError @e """
+        pass
+
     def mainloop(self):
         """ listens on server for events and calls on_feature_change. Return when connection closed """
         while not self._stoploop.is_set(): self.mainloop_hook()
@@ -250,7 +365,7 @@ class _AbstractClient(ProtocolBase):
         pass
     
 
-class AbstractClient(_FeaturesMixin, _AbstractClient): pass
+class AbstractClient(_ScenesMixin, _QueriesMixin, _FeaturesMixin, _AbstractClient): pass
 
 
 class AbstractProtocol(ProtocolBase):
@@ -0,0 +1,77 @@
+"""
+Drive a client created with threaded=False from a GUI main loop. Parsing and events
+then run in the GUI thread.
+Example:
+    amp = Amp(connect=False, threaded=False)
+    GLibDriver(amp.enter())
+"""
+
+
+class _Driver:
+    """ Calls @client.process_io() on I/O and after @client.timeout() """
+
+    def __init__(self, client):
+        if client.threaded: raise ValueError("%s must be created with threaded=False"%client)
+        self.client = client
+        self._timer = None
+        self._schedule()
+
+    def step(self):
+        self.client.process_io()
+        self._schedule()
+
+    def _schedule(self): raise NotImplementedError()
+
+    def stop(self): raise NotImplementedError()
+
+
+class GLibDriver(_Driver):
+    """ Watches the client's fileno() in the GLib main context """
+
+    def __init__(self, client):
+        from gi.repository import GLib
+        self._glib = GLib
+        self._watch = GLib.io_add_watch(client.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self._on_io)
+        super().__init__(client)
+
+    def _on_io(self, fd, condition):
+        self.step()
+        return True
+
+    def _on_timeout(self):
+        self._timer = None
+        self.step()
+        return False
+
+    def _schedule(self):
+        if self._timer: self._glib.source_remove(self._timer)
+        self._timer = self._glib.timeout_add(int(self.client.timeout()*1000)+1, self._on_timeout)
+
+    def stop(self):
+        if self._timer: self._glib.source_remove(self._timer)
+        if self._watch: self._glib.source_remove(self._watch)
+        self._timer = self._watch = None
+
+
+class KivyDriver(_Driver):
+    """ Kivy has no file watches, so the client is being polled every frame up to @interval seconds """
+
+    def __init__(self, client, interval=.02):
+        from kivy.clock import Clock
+        self._clock = Clock
+        self.interval = interval
+        super().__init__(client)
+
+    def _on_timeout(self, dt):
+        self._timer = None
+        self.step()
+
+    def _schedule(self):
+        if self._timer: self._timer.cancel()
+        self._timer = self._clock.schedule_once(
+            self._on_timeout, min(self.interval, self.client.timeout()))
+
+    def stop(self):
+        if self._timer: self._timer.cancel()
+        self._timer = None
+
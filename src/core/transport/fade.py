@@ -0,0 +1,161 @@
+"""
+Timed fades of numeric features. The steps of a fade are being computed ahead of time
+and all fades on one amp are being sent by a single scheduler thread.
+"""
+
+import sys, time, weakref
+from threading import Thread, Lock, Condition, Event
+
+
+CURVES = {
+    "linear": lambda x: x,
+    "ease-in": lambda x: x*x,
+    "ease-out": lambda x: 1-(1-x)**2,
+    "ease-in-out": lambda x: x*x*(3-2*x),
+}
+
+
+def _inverse(curve, y, precision=1e-4):
+    """ returns x in [0,1] where @curve(x) == @y for a monotonic @curve """
+    lo, hi = 0., 1.
+    while hi-lo > precision:
+        mid = (lo+hi)/2
+        if curve(mid) < y: lo = mid
+        else: hi = mid
+    return hi
+
+
+class Fade:
+    """ Fade of @feature to value @to within @duration seconds. It finishes when the amp
+    has echoed @to or call_timeout() seconds after sending it """
+
+    def __init__(self, feature, to, duration, curve="linear"):
+        if not callable(curve):
+            try: curve = CURVES[curve]
+            except KeyError: raise ValueError("curve must be callable or one of %s"%list(CURVES))
+        self.feature = feature
+        start = feature.get()
+        to = max(feature.min, min(feature.max, feature.type(to)))
+        step = feature.fade_step if to > start else -feature.fade_step
+        values = [feature.type(start+step*i) for i in range(1, int(abs(to-start)/feature.fade_step)+1)]
+        if not values or values[-1] != to: values.append(to)
+        begin = time.monotonic()
+        self.steps = [
+            (begin+duration*_inverse(curve, float((value-start)/(to-start))), value)
+            for value in values] if to != start else []
+        self.final = to if self.steps else None
+        self.deadline = None # for the echo of the final value
+        self.sent = set()
+        self._echoed = False
+        self.done = Event()
+
+    def __repr__(self): return "<Fade %s: %d steps left>"%(self.feature.key, len(self.steps))
+
+    def pop_due(self, now):
+        """ returns the newest value that is due and drops the older ones """
+        value = None
+        while self.steps and self.steps[0][0] <= now: value = self.steps.pop(0)[1]
+        return value
+
+    next_time = property(lambda self: self.steps[0][0] if self.steps else self.deadline)
+
+    def on_change(self, value): # subscribed to feature
+        """ Cancel on foreign values. Echoes arriving before the first own echo may be outdated """
+        if value in self.sent:
+            self._echoed = True
+            if value == self.final and not self.steps: self.cancel()
+        elif self._echoed: self.cancel()
+
+    def cancel(self): Fader.get(self.feature.amp).cancel(self.feature, self)
+
+    def wait(self, timeout=None):
+        """ wait until the fade has finished or has been cancelled """
+        return self.done.wait(timeout)
+
+
+class Fader:
+    """ Scheduler that sends the steps of all fades on one amp """
+    _instances = weakref.WeakKeyDictionary()
+    _instances_lock = Lock()
+
+    def __init__(self):
+        self._fades = {} # feature key: Fade
+        self._cond = Condition()
+        self._thread = None
+
+    @classmethod
+    def get(cls, amp):
+        with cls._instances_lock:
+            if amp not in cls._instances: cls._instances[amp] = cls()
+            return cls._instances[amp]
+
+    def start(self, fade):
+        """ start @fade and replace a running fade of the same feature """
+        self.cancel(fade.feature)
+        with self._cond:
+            self._fades[fade.feature.key] = fade
+            fade.feature.subscribe(fade.on_change)
+            if not self._thread:
+                self._thread = Thread(target=self.mainloop, name=self.__class__.__name__, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return fade
+
+    def cancel(self, feature, fade=None):
+        """ stop fading @feature. If @fade is given, only stop it if it is running """
+        with self._cond:
+            running = self._fades.get(feature.key)
+            if not running or fade and running is not fade: return
+            self._finish(running)
+
+    def _finish(self, fade):
+        del self._fades[fade.feature.key]
+        fade.feature.unsubscribe(fade.on_change)
+        fade.done.set()
+
+    def mainloop(self):
+        while True:
+            with self._cond:
+                if not self._fades:
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                due = []
+                for fade in list(self._fades.values()):
+                    value = fade.pop_due(now)
+                    if value is not None:
+                        fade.sent.add(value)
+                        due.append((fade, value))
+                    if fade.steps: continue
+                    if fade.deadline is None and fade.final is not None:
+                        fade.deadline = now+fade.feature.amp.call_timeout(fade.feature)
+                    elif fade.deadline is None or fade.deadline <= now: self._finish(fade)
+                if not due:
+                    next_time = min(filter(None, (f.next_time for f in self._fades.values())), default=now)
+                    self._cond.wait(max(0, next_time-now))
+                    continue
+            for fade, value in due:
+                try: fade.feature.send_step(value)
+                except ConnectionError as e:
+                    print("[%s] %s"%(self.__class__.__name__, repr(e)), file=sys.stderr)
+                    fade.cancel()
+
+
+class FadeMixin:
+    """ Adds fade() to a numeric feature. Steps have the distance @fade_step """
+    fade_step = 1
+
+    def fade(self, to, duration, curve="linear"):
+        """
+        Change value to @to within @duration seconds. Any other change of the value cancels the fade.
+        @curve: One of CURVES or callable mapping time [0,1] to progress [0,1]
+        Returns a Fade object that has wait() and cancel()
+        """
+        return Fader.get(self.amp).start(Fade(self, to, duration, curve))
+
+    def send(self, *args, **xargs):
+        Fader.get(self.amp).cancel(self)
+        return super().send(*args, **xargs)
+
+    def send_step(self, value): return super().send(value, force=True)
+
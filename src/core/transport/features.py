@@ -1,21 +1,23 @@
-import sys, traceback, re
+import sys, traceback, re, time
 from contextlib import suppress
 from decimal import Decimal
 from threading import Event, Lock, Timer
 from datetime import datetime, timedelta
 from ..util import call_sequence, Bindable
+from ..util.metrics import Metric
 from ..config import config
 from .protocol_type import ProtocolType
+from .scheduler import AWAITED, BACKGROUND
 
 
-MAX_CALL_DELAY = 2 #seconds, max delay for calling function using "@require"
+MAX_CALL_DELAY = 2 #seconds, default delay for calling function using "@require"
 
 
-def require(*features, timeout=MAX_CALL_DELAY):
+def require(*features, timeout=None):
     """
     Decorator that states which features have to be loaded before calling the function.
     Call might be delayed until the feature values have been set.
-    Skip call if delay is longer than @timeout seconds.
+    Skip call if delay is longer than @timeout seconds. Default is the amp's call_timeout().
     Can be used in Amp or AmpEvents.
     Example: @require("volume","muted")
     """
@@ -25,11 +27,11 @@ def require(*features, timeout=MAX_CALL_DELAY):
 class FunctionCall(object):
     """ Function call that requires features. Drops call if no connection """
 
-    def __init__(self, features, func, args=set(), kwargs={}, timeout=MAX_CALL_DELAY):
+    def __init__(self, features, func, args=set(), kwargs={}, timeout=None):
         self._func = func
         self._args = args
         self._kwargs = kwargs
-        self._timeout = datetime.now()+timedelta(seconds=timeout) if timeout != None else None
+        self._timeout = None
         self.amp = self._find_amp(args)
         if not self.amp or not self.amp.connected: return
         try: self._features = [self.amp.features[name] for name in features]
@@ -38,10 +40,12 @@ class FunctionCall(object):
                 print("[%s] Warning: Amp does not provide feature required by `%s`: %s"
                 %(self.__class__.__name__,self._func.__name__,e), file=sys.stderr)
             return
+        if timeout is None: timeout = max(map(self.amp.call_timeout, self._features), default=0)
+        self._timeout = datetime.now()+timedelta(seconds=timeout)
         self.missing_features = list(filter(lambda f:not f.isset(), self._features))
         if self._try_call(): return
         self.amp._pending.append(self) #postpone
-        try: [f.async_poll() for f in self.missing_features]
+        try: [f.async_poll(priority=AWAITED) for f in self.missing_features]
         except ConnectionError: self.cancel()
     
     def __repr__(self): return "<pending%s>"%self._func
@@ -86,6 +90,7 @@ class FeatureInterface(object):
     category = "Misc"
     call = None # for retrieval, call amp.send(call)
     default_value = None #if no response
+    timeout = None # seconds to wait for an answer, default: amp.call_timeout()
     type = object # value data type, e.g. int, bool, str
     #key = "key" # feature will be available as amp.key; default: key = class name
     
@@ -124,14 +129,16 @@ class AsyncFeature(FeatureInterface, Bindable, metaclass=_MetaFeature):
     An attribute of the amplifier
     High level telnet protocol communication
     """
-    _val = None
+    _state = (0, None) # (version, value), replaced as a whole so that reading needs no lock
     _block_on_send = None
+    _subscribers = ()
 
     def __init__(self, amp):
         """ amp instance, connected amp attribute name """
         super().__init__()
         self.amp = amp
         self._lock = Lock()
+        self._subscribers_lock = Lock()
         amp.features[self.key] = self
         
     name = property(lambda self:self.__class__.__name__)
@@ -139,8 +146,19 @@ class AsyncFeature(FeatureInterface, Bindable, metaclass=_MetaFeature):
     def __str__(self): return str(self.get()) if self.isset() else "..."
     
     def get(self):
-        if not self.isset(): raise AttributeError("`%s` not available. Use @require"%self.key)
-        else: return self._val
+        val = self._state[1]
+        if val is None or not self.isset():
+            raise AttributeError("`%s` not available. Use @require"%self.key)
+        return val
+
+    def _set_val(self, value): self._state = (self._state[0]+1, value)
+
+    _val = property(lambda self: self._state[1], _set_val)
+    version = property(lambda self: self._state[0], doc="changes whenever the value is being replaced")
+
+    def snapshot(self):
+        """ returns a consistent pair (version, value) without locking. value is None if unset """
+        return self._state
     
     def send(self, value, force=False):
         assert(value is not None)
@@ -161,12 +179,16 @@ class AsyncFeature(FeatureInterface, Bindable, metaclass=_MetaFeature):
 
     def async_poll(self, *args, **xargs): self.amp.poll_feature(self, *args, **xargs)
     
-    def poll_on_client(self):
+    def poll_on_client(self, priority=BACKGROUND):
         """ async_poll() executed on client side """
-        if self.default_value is not None:
-            self._timer_store_default = Timer(MAX_CALL_DELAY, self._store_default)
-            self._timer_store_default.start()
-        if self.call is not None: self.amp.send(self.call)
+        if self.default_value is not None: self.await_default(self.amp.call_timeout(self))
+        if self.call is not None: self.amp.send(self.call, priority)
+
+    def await_default(self, delay):
+        """ store default_value if the feature has not been set within @delay seconds """
+        with suppress(AttributeError): self._timer_store_default.cancel()
+        self._timer_store_default = Timer(delay, self._store_default)
+        self._timer_store_default.start()
     
     def _store_default(self):
         with self._lock:
@@ -209,8 +231,18 @@ class AsyncFeature(FeatureInterface, Bindable, metaclass=_MetaFeature):
             if on_unset: super().bind(on_unset = on_unset)
             if on_store: super().bind(on_store = on_store)
             
+    def subscribe(self, on_change):
+        """ Call on_change(value) on each change until unsubscribe(on_change) is called.
+        Unlike bind(), the callback is not being called immediately """
+        with self._subscribers_lock: self._subscribers = self._subscribers+(on_change,)
+
+    def unsubscribe(self, on_change):
+        with self._subscribers_lock:
+            self._subscribers = tuple(c for c in self._subscribers if c != on_change)
+
     def on_change(self, old, new):
         """ This event is being called when self.options or the return value of self.get() changes """
+        for callback in self._subscribers: callback(new)
         self.amp.on_feature_change(self.key, new, old)
     
     def on_set(self):
@@ -236,27 +268,33 @@ class AsyncFeature(FeatureInterface, Bindable, metaclass=_MetaFeature):
 
 
 class SynchronousFeature(AsyncFeature):
+    """ get() polls the value if it is not set. Reading a set value does not lock """
+    poll_lock_wait = None # Metric: seconds waited for _poll_lock on a miss
 
     def __init__(self,*args,**xargs):
         self._poll_lock = Lock()
+        self.poll_lock_wait = Metric()
         super().__init__(*args,**xargs)
 
     def get(self):
-        self._poll_lock.acquire()
-        try:
-            try: return super().get()
-            except AttributeError:
-                self.poll()
-                return super().get()
-        finally: self._poll_lock.release()
+        try: return super().get()
+        except AttributeError: return self._get_on_miss()
+
+    def _get_on_miss(self):
+        start = time.monotonic()
+        with self._poll_lock:
+            self.poll_lock_wait.add(time.monotonic()-start)
+            # another thread might have polled while we were waiting
+            if not self.isset(): self.poll()
+            return super().get()
         
     def poll(self, force=False):
         """ synchronous poll """
-        self.async_poll(force)
+        self.async_poll(force, priority=AWAITED)
         e = Event()
         def poll_event(self): e.set()
         require(self.key)(poll_event)(self)
-        if not e.wait(timeout=MAX_CALL_DELAY+.1):
+        if not e.wait(timeout=self.amp.call_timeout(self)+.1):
             raise ConnectionError("Timeout on waiting for answer for %s"%self.__class__.__name__)
         return super().get()
     
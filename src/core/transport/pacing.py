@@ -0,0 +1,117 @@
+"""
+Adaptive gap between two commands on one connection
+"""
+
+import time
+from collections import deque
+from threading import Lock
+
+
+class Pacer:
+    """
+    Keeps a minimum gap between two sent commands within [@min_gap, @max_gap] seconds.
+    A command without an answer within its deadline counts as dropped and doubles the gap.
+    Amps do not answer queries for unsupported features, so only queries that have been answered
+    before and set commands with an answered @prefix count.
+    The deadline derives from the measured echo time and is at most @deadline seconds.
+    After @clean_run answers without a drop, the gap shrinks by the factor @decrease.
+    Answers are being assigned to the oldest command that they start with or else
+    to the oldest command with the same first @prefix characters.
+    """
+    prefix = 2
+    min_deadline = .1
+    clean_run = 10
+    decrease = .9
+
+    def __init__(self, min_gap=.005, max_gap=.2, deadline=1, gap=.01):
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.deadline = deadline
+        self.gap = max(min_gap, min(max_gap, gap))
+        self.srtt = None # smoothed time until answer
+        self.rttvar = None # its variation
+        self.dropped = 0
+        self._outstanding = deque() # (command stem, time, is query)
+        self._answered = set() # stems and prefixes that the amp has answered
+        self._clean = 0 # answers since the last drop
+        self._last_send = 0
+        self._last_increase = 0
+        self._lock = Lock()
+
+    def __repr__(self):
+        return "<%s gap=%.3fs srtt=%s dropped=%d>"%(self.__class__.__name__, self.gap,
+            "%.3fs"%self.srtt if self.srtt is not None else "?", self.dropped)
+
+    def timeout(self, default):
+        """ time to wait for an answer, @default if nothing has been measured """
+        return default if self.srtt is None else self.srtt+4*self.rttvar
+
+    def drop_deadline(self):
+        """ seconds after which an unanswered command counts as dropped """
+        return max(self.min_deadline, min(self.deadline, self.timeout(self.deadline)))
+
+    def reset(self):
+        with self._lock: self._outstanding.clear()
+
+    def ready_in(self):
+        """ seconds until the next command may be sent """
+        return max(0, self._last_send+self.gap-time.monotonic())
+
+    def wait(self):
+        """ sleep until the next command may be sent """
+        self.check()
+        delay = self.ready_in()
+        if delay > 0: time.sleep(delay)
+
+    def check(self):
+        """ count commands without answer as dropped. Returns seconds until the next check is due """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if not self._outstanding: return self.deadline
+            return max(0, self._outstanding[0][1]+self.drop_deadline()-now)
+
+    def on_send(self, cmd):
+        now = time.monotonic()
+        self._last_send = now
+        with self._lock:
+            self._expire(now)
+            if cmd: self._outstanding.append((cmd.rstrip("? "), now, cmd.endswith("?")))
+
+    def on_receive(self, data):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            sent = next((e for e in self._outstanding if data.startswith(e[0])), None)
+            if sent: self._answered.add(sent[0])
+            else: sent = next((e for e in self._outstanding if e[0][:self.prefix] == data[:self.prefix]), None)
+            if not sent: return
+            self._outstanding.remove(sent)
+            self._answered.add(sent[0][:self.prefix])
+            rtt = now-sent[1]
+            if self.srtt is None: self.srtt, self.rttvar = rtt, rtt/2
+            else:
+                self.rttvar = .75*self.rttvar+.25*abs(self.srtt-rtt)
+                self.srtt = .875*self.srtt+.125*rtt
+            self._clean += 1
+            if self._clean >= self.clean_run:
+                self._clean = 0
+                self.gap = max(self.min_gap, self.gap*self.decrease)
+            return rtt
+
+    def _is_echoed(self, stem, query):
+        """ whether the command is expected to be answered """
+        return stem in self._answered if query else stem[:self.prefix] in self._answered
+
+    def _expire(self, now):
+        deadline = now-self.drop_deadline()
+        while self._outstanding and self._outstanding[0][1] < deadline:
+            stem, sent, query = self._outstanding.popleft()
+            if not self._is_echoed(stem, query): continue
+            self.dropped += 1
+            self._clean = 0
+            # commands sent before the last increase do not count again
+            if sent > self._last_increase:
+                self._last_increase = now
+                self.gap = min(self.max_gap, self.gap*2)
+
@@ -0,0 +1,71 @@
+"""
+Scenes set many features at once. Only values that differ from the amp's state are being sent,
+stage by stage in the order of SCENE_STAGES.
+"""
+
+import sys
+from threading import Event, Condition
+from ..config import config
+from . import features
+
+
+SCENE_STAGES = (
+    lambda f: f.key == config.power or f.key.endswith("_power"),
+    lambda f: f.key == config.source,
+    lambda f: f.key == "sound_mode",
+    lambda f: f.category != "Volume",
+    lambda f: True,
+)
+
+
+class _ScenesMixin:
+    scene_stages = SCENE_STAGES
+
+    def apply(self, values, timeout=None):
+        """
+        Set feature values from dict @values {key: value}. Missing values are being polled at once,
+        then the differences are being sent stage by stage. Each stage is being sent without pause
+        and waits up to @timeout seconds for the echoes, default: call_timeout()
+        Returns the keys of the features that have been sent.
+        """
+        fs = {self.features[key]: value for key, value in values.items()}
+        if timeout is None: timeout = max(map(self.call_timeout, fs), default=0)
+        for f, value in fs.items():
+            if isinstance(f, features.SelectFeature) and value not in f.options:
+                raise ValueError("%s must be one of %s"%(f.key, f.options))
+        self._poll_scene([f for f in fs if not f.isset()], timeout)
+        changes = {f: value for f, value in fs.items() if not self._scene_value_equals(f, value)}
+        stages = [[] for stage in self.scene_stages]
+        for f in changes: stages[next(i for i, s in enumerate(self.scene_stages) if s(f))].append(f)
+        for stage in filter(None, stages): self._apply_stage({f: changes[f] for f in stage}, timeout)
+        return [f.key for f in changes]
+
+    def _poll_scene(self, fs, timeout):
+        if not fs: return
+        e = Event()
+        features.require(*[f.key for f in fs], timeout=timeout)(lambda amp: e.set())(self)
+        e.wait(timeout)
+
+    @staticmethod
+    def _scene_value_equals(f, value):
+        if not f.isset(): return False
+        try: return f.encode(value) == f.encode(f.get())
+        except Exception: return False
+
+    def _apply_stage(self, changes, timeout):
+        pending = set(changes)
+        cond = Condition()
+        def confirm(value, f):
+            with cond:
+                pending.discard(f)
+                cond.notify()
+        callbacks = {f: lambda value, f=f: confirm(value, f) for f in changes}
+        for f, callback in callbacks.items(): f.subscribe(callback)
+        try:
+            for f, value in changes.items(): f.send(value)
+            with cond: cond.wait_for(lambda: not pending, timeout)
+        finally:
+            for f, callback in callbacks.items(): f.unsubscribe(callback)
+        if pending: print("[%s] WARNING: No answer for %s"
+            %(self.__class__.__name__, ", ".join(f.key for f in pending)), file=sys.stderr)
+
@@ -0,0 +1,99 @@
+"""
+Prioritised queue for outbound commands
+"""
+
+import time
+from collections import deque
+from threading import Thread, Condition
+from ..util.metrics import Metric
+
+
+INTERACTIVE = 0 # commands from the user
+AWAITED = 1 # polls that somebody is waiting for
+BACKGROUND = 2 # preloading and refreshing
+
+PRIORITIES = {INTERACTIVE: "interactive", AWAITED: "awaited", BACKGROUND: "background"}
+
+
+class Scheduler:
+    """
+    Sends queued commands with @write(cmd) in a separate thread, higher priority first.
+    If @threaded is False, the owner takes the commands with pop() instead.
+    A command that has been waiting longer than @starvation_limit seconds is being sent
+    before higher priority commands.
+    """
+    starvation_limit = 1
+
+    def __init__(self, write, name="Scheduler", threaded=True):
+        self._write = write
+        self._name = name
+        self.threaded = threaded
+        self._queues = {priority: deque() for priority in PRIORITIES} # (time, cmd)
+        self._cond = Condition()
+        self._busy = False
+        self._stopped = False
+        self._thread = None
+        self.metrics = {name: Metric() for name in PRIORITIES.values()} # queue wait in seconds
+
+    def __len__(self): return sum(map(len, self._queues.values()))
+
+    def put(self, cmd, priority=INTERACTIVE):
+        with self._cond:
+            self._queues[priority].append((time.monotonic(), cmd))
+            if self.threaded and not self._thread:
+                self._stopped = False
+                self._thread = Thread(target=self.mainloop, name=self._name, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            for queue in self._queues.values(): queue.clear()
+            self._cond.notify_all()
+
+    def drop(self, priority):
+        """ discard queued commands of @priority """
+        with self._cond:
+            self._queues[priority].clear()
+            self._cond.notify_all()
+
+    def stop(self, timeout=None):
+        """ terminate the sender thread. Queued commands are being discarded """
+        with self._cond:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            self._cond.notify_all()
+        if thread: thread.join(timeout)
+
+    def flush(self, timeout=None):
+        """ wait until all queued commands have been sent """
+        with self._cond: return self._cond.wait_for(lambda: not self._busy and not len(self), timeout)
+
+    def pop(self):
+        """ returns the next command or None if the queue is empty """
+        with self._cond:
+            if not len(self): return None
+            cmd = self._pop()
+            self._cond.notify_all()
+            return cmd
+
+    def _pop(self):
+        now = time.monotonic()
+        heads = [(queue[0][0], priority) for priority, queue in self._queues.items() if queue]
+        starving = [head for head in heads if head[0] < now-self.starvation_limit]
+        priority = min(starving)[1] if starving else min(heads, key=lambda head: head[1])[1]
+        queued, cmd = self._queues[priority].popleft()
+        self.metrics[PRIORITIES[priority]].add(now-queued)
+        return cmd
+
+    def mainloop(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: len(self) or self._stopped)
+                if self._stopped: return
+                cmd = self._pop()
+                self._busy = True
+            self._write(cmd)
+
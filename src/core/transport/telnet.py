@@ -1,11 +1,30 @@
-import time, socket, time, selectors, traceback
-from telnetlib import Telnet
-from threading import Lock, Thread, Event
+import sys, os, time, socket, selectors, traceback, random, errno
+from threading import Lock, Thread
 from contextlib import suppress
 from ..util.json_service import Service
+from ..config import config
+from ..config import FILE as CONFFILE
+from .pacing import Pacer
+from .scheduler import Scheduler, INTERACTIVE, BACKGROUND
 from .abstract import AbstractProtocol, AbstractClient, AbstractServer
 
 
+class Backoff:
+    """ Exponential delays between @base and @cap seconds with random jitter """
+
+    def __init__(self, base=.5, cap=30):
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def reset(self): self.attempt = 0
+
+    def next(self):
+        delay = min(self.cap, self.base*2**self.attempt)
+        self.attempt += 1
+        return random.uniform(delay/2, delay)
+
+
 class TelnetClient(AbstractClient):
     """
     This class connects to the server via LAN and executes commands
@@ -13,15 +32,40 @@ class TelnetClient(AbstractClient):
     """
     host = None
     port = None
-    _pulse = "" # this is being sent regularly to keep connection
-    _telnet = None
+    _pulse = "" # this is being sent to keep the connection when idle. Set None to disable
+    keepalive_idle = 10 # seconds without received data until _pulse is being sent
+    keepalive_deadline = 3 # seconds to wait for an answer to a non-empty _pulse
+    _pulse_deadline = None
+    _last_received = 0
+    _sock = None
+    _buffer = b""
+    _selector = None
+    _wakeup = None # socket pair for interrupting the mainloop
+    _backoff = None
     _send_lock = None
-    _pulse_stop = None
+    _pacer = None
+    _scheduler = None
+    _connecting = None # (socket, deadline) in thread-free mode
+    _reconnect_at = 0
+    flush_timeout = 1 # seconds for sending the queued commands on exit()
     
     def __init__(self, host, port=23, *args, **xargs):
         super().__init__(*args, **xargs)
         self._send_lock = Lock()
-        self._pulse_stop = Event()
+        self._scheduler = Scheduler(
+            self._write, name="%s sender"%self.__class__.__name__, threaded=self.threaded)
+        self._pacer = Pacer(
+            min_gap=config.getfloat("Telnet","min_send_gap"),
+            max_gap=config.getfloat("Telnet","max_send_gap"),
+            deadline=config.getfloat("Telnet","echo_deadline"))
+        self._backoff = Backoff(
+            config.getfloat("Telnet","reconnect_delay"), config.getfloat("Telnet","reconnect_max_delay"))
+        self.keepalive_idle = config.getfloat("Telnet","keepalive_idle")
+        self.keepalive_deadline = config.getfloat("Telnet","keepalive_deadline")
+        self._wakeup = socket.socketpair()
+        for sock in self._wakeup: sock.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
         self.host = host
         self.port = port
         if not self.host: raise RuntimeError("Host is not set! Execute setup or set AVR "
@@ -34,68 +78,306 @@ class TelnetClient(AbstractClient):
         if self.port: p = "%s:%s"%(p,self.port)
         return p
     
-    def send(self, cmd):
-        super().send(cmd)
+    min_call_timeout = .5
+    max_call_timeout = 10
+
+    def call_timeout(self, f=None):
+        if f is not None and f.timeout is not None: return f.timeout
+        # commands ahead in the queue delay the answer
+        timeout = self._pacer.timeout(super().call_timeout())+len(self._scheduler)*self._pacer.gap
+        return max(self.min_call_timeout, min(self.max_call_timeout, timeout))
+
+    def quiet_time(self):
+        if self._pacer.srtt is None: return super().quiet_time()
+        return max(.1, min(self.call_timeout(), 2*self._pacer.srtt))
+
+    queue_metrics = property(lambda self: self._scheduler.metrics, doc="queue wait per priority")
+
+    def send(self, cmd, priority=INTERACTIVE):
+        """ queue @cmd for sending. @priority: one of INTERACTIVE, AWAITED, BACKGROUND """
+        super().send(cmd, priority)
+        if not self.connected: raise BrokenPipeError("Not connected")
+        self._scheduler.put(cmd, priority)
+        if not self.threaded: self._wake()
+
+    def _write(self, cmd):
+        """ executed by the scheduler """
         try:
             with self._send_lock:
-                assert(self.connected and self._telnet.sock)
-                self._telnet.write(("%s\r"%cmd).encode("ascii"))
-                time.sleep(.01)
+                assert(self.connected and self._sock)
+                self._pacer.wait()
+                self._sock.sendall(("%s\r"%cmd).encode("ascii"))
+                self._pacer.on_send(cmd)
         except (OSError, EOFError, AssertionError, AttributeError) as e:
-            self.on_disconnected()
-            raise BrokenPipeError(e)
+            if self.connected: self.on_disconnected()
+
+    def _wake(self):
+        """ interrupt a waiting read() or reconnect delay """
+        with suppress(OSError): self._wakeup[1].send(b"\0")
+
+    def _drain_wakeup(self):
+        with suppress(OSError): self._wakeup[0].recv(4096)
+
+    def _select(self, timeout):
+        """ wait for data or wakeup. Returns True if socket is readable """
+        readable = False
+        for key, mask in self._selector.select(timeout):
+            if key.fileobj is self._wakeup[0]: self._drain_wakeup()
+            else: readable = True
+        return readable
+
+    def _pop_line(self):
+        if b"\r" not in self._buffer: return None
+        line, self._buffer = self._buffer.split(b"\r", 1)
+        return line.strip().decode()
         
     def read(self, timeout=None):
+        """ returns the next line or None on timeout or wakeup """
+        line = self._pop_line()
+        if line is not None: return line
         try:
-            assert(self.connected and self._telnet.sock)
-            return self._telnet.read_until(b"\r",timeout=timeout).strip().decode()
-        except socket.timeout: return None
+            assert(self.connected and self._sock)
+            if self._select(timeout):
+                data = self._sock.recv(4096)
+                if not data: raise EOFError("Connection closed by peer")
+                self._buffer += data
         except (OSError, EOFError, AssertionError, AttributeError) as e:
-            self.on_disconnected()
+            if self.connected: self.on_disconnected()
             raise BrokenPipeError(e)
+        return self._pop_line()
+
+    def _start_open(self):
+        """ starts a non-blocking connect and returns the socket """
+        family, type_, proto, canonname, address = socket.getaddrinfo(
+            self.host, self.port, type=socket.SOCK_STREAM)[0]
+        sock = socket.socket(family, type_, proto)
+        try:
+            sock.setblocking(False)
+            err = sock.connect_ex(address)
+            if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK): raise OSError(err, os.strerror(err))
+        except:
+            sock.close()
+            raise
+        return sock
+
+    def _finish_open(self, sock):
+        """ call when @sock is writable """
+        err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err: raise OSError(err, os.strerror(err))
+        sock.settimeout(config.getfloat("Telnet","connect_timeout"))
+
+    def _open(self, timeout):
+        """ non-blocking connect that can be interrupted by _wake() while the loop is being stopped """
+        self._drain_wakeup() # left from an earlier disconnect() or reconnect_now()
+        deadline = time.monotonic()+timeout
+        sock = self._start_open()
+        sel = selectors.DefaultSelector()
+        try:
+            sel.register(sock, selectors.EVENT_WRITE)
+            sel.register(self._wakeup[0], selectors.EVENT_READ)
+            while True:
+                events = [key.fileobj for key, mask in sel.select(max(0, deadline-time.monotonic()))]
+                if self._wakeup[0] in events:
+                    self._drain_wakeup()
+                    if self._stoploop.is_set(): raise ConnectionAbortedError("Interrupted")
+                if sock in events: break
+                if time.monotonic() >= deadline: raise socket.timeout("Connection timed out")
+            self._finish_open(sock)
+        except:
+            sock.close()
+            raise
+        finally: sel.close()
+        return sock
     
     def connect(self):
         super().connect()
         if self.connected: return
-        try: self._telnet = Telnet(self.host,self.port,timeout=2)
+        try: sock = self._open(config.getfloat("Telnet","connect_timeout"))
+        except ConnectionAbortedError as e: raise ConnectionError(e) # interrupted by _wake()
         except (ConnectionError, socket.timeout, socket.gaierror, socket.herror, OSError) as e:
-            raise ConnectionError(e)
-        else: self.on_connect()
+            e = ConnectionError(e)
+            self.on_connect_failed(e)
+            raise e
+        self._on_open(sock)
+
+    def _on_open(self, sock):
+        self._sock = sock
+        self._buffer = b""
+        self._selector.register(sock, selectors.EVENT_READ)
+        self._backoff.reset()
+        self.on_connect()
+
+    def exit(self):
+        self._scheduler.drop(BACKGROUND)
+        if self.threaded: self._scheduler.flush(timeout=self.flush_timeout)
+        else: self._send_queued(deadline=time.monotonic()+self.flush_timeout)
+        self._scheduler.stop(timeout=self.flush_timeout)
+        super().exit()
 
     def disconnect(self):
         super().disconnect()
-        with suppress(AttributeError, OSError):
-            self._telnet.sock.shutdown(socket.SHUT_WR) # break read()
-            self._telnet.close()
+        with suppress(AttributeError, OSError): self._sock.shutdown(socket.SHUT_RDWR) # break read()
+        self._abort_open()
+        self._wake()
     
+    def on_receive_raw_data(self, data):
+        self._last_received = time.monotonic()
+        self._pulse_deadline = None
+        self._pacer.on_receive(data)
+        super().on_receive_raw_data(data)
+
     def on_connect(self):
+        self._pacer.reset()
+        self._last_received = time.monotonic()
+        self._pulse_deadline = None
         super().on_connect()
-        def func():
-            while not self._pulse_stop.wait(10): self.send(self._pulse)
-        self._pulse_stop.clear()
-        if self._pulse is not None: Thread(target=func, daemon=True, name="pulse").start()
         
     def on_disconnected(self):
         super().on_disconnected()
-        self._pulse_stop.set()
+        self._scheduler.clear()
+        sock, self._sock = self._sock, None
+        if sock:
+            with suppress(KeyError, ValueError): self._selector.unregister(sock)
+            sock.close()
         
+    def _keepalive_due(self):
+        """ seconds until _keepalive() has something to do """
+        if self._pulse is None or not self.keepalive_idle: return 5
+        if self._pulse_deadline: return self._pulse_deadline-time.monotonic()
+        return self._last_received+self.keepalive_idle-time.monotonic()
+
+    def _keepalive(self):
+        """ Sends _pulse when idle and detects half-open connections.
+        Returns seconds until the next check """
+        due = self._keepalive_due()
+        if due > 0: return due
+        if self._pulse_deadline:
+            if self.verbose > 0: print("[%s] No answer to keepalive. Reconnecting"
+                %self.__class__.__name__, file=sys.stderr)
+            self.on_disconnected()
+            return 0
+        now = time.monotonic()
+        try: self.send(self._pulse, BACKGROUND)
+        except ConnectionError: return 0
+        if self._pulse and self.keepalive_deadline:
+            self._pulse_deadline = now+self.keepalive_deadline
+            return self.keepalive_deadline
+        self._last_received = now
+        return self.keepalive_idle
+
     def mainloop_hook(self):
         super().mainloop_hook()
         if self.connected:
-            try: data = self.read(5)
+            try: data = self.read(min(self._keepalive(), self._pacer.check()))
             except ConnectionError: pass
             else:
                 if data: self.on_receive_raw_data(data)
         else:
             try: self.connect()
-            except ConnectionError: return self._stoploop.wait(3)
+            except ConnectionError as e:
+                if self._stoploop.is_set(): return
+                self._reconnect_later(e)
+                self._select(max(0, self._reconnect_at-time.monotonic()))
+
+    def _reconnect_later(self, e):
+        delay = self._backoff.next()
+        if self.verbose > 1: print("[%s] %s. Reconnecting in %.1fs"
+            %(self.__class__.__name__, e, delay), file=sys.stderr)
+        self._reconnect_at = time.monotonic()+delay
+
+    def reconnect_now(self):
+        """ skip the current reconnect delay """
+        self._backoff.reset()
+        self._reconnect_at = 0
+        self._wake()
+
+    def _abort_open(self):
+        if not self._connecting: return
+        sock, deadline = self._connecting
+        self._connecting = None
+        with suppress(KeyError, ValueError): self._selector.unregister(sock)
+        sock.close()
+
+    def _send_queued(self, deadline=None):
+        """ thread-free mode: write queued commands while the pacing allows.
+        With @deadline, wait for the pacing until time.monotonic() reaches @deadline """
+        while len(self._scheduler):
+            delay = self._pacer.ready_in()
+            if delay and (deadline is None or time.monotonic()+delay > deadline): return
+            cmd = self._scheduler.pop()
+            if cmd is not None: self._write(cmd)
+
+    def fileno(self):
+        """
+        Thread-free mode: File descriptor that becomes readable when process_io() has work to do.
+        It does not change on reconnects.
+        """
+        return self._selector.fileno()
+
+    def timeout(self):
+        """ Thread-free mode: seconds until process_io() must be called even without I/O """
+        now = time.monotonic()
+        if self.connected:
+            timeout = min(self._keepalive_due(), self._pacer.check())
+            if len(self._scheduler): timeout = min(timeout, self._pacer.ready_in())
+        elif self._connecting: timeout = self._connecting[1]-now
+        else: timeout = self._reconnect_at-now
+        return max(0, min(5, timeout))
+
+    def process_io(self):
+        """
+        Thread-free mode: Process pending I/O without blocking. Call it when fileno() is readable
+        and timeout() seconds after the last call. Events are being called in the caller's thread.
+        Note that a synchronous get() of an unset feature blocks this thread until its timeout.
+        """
+        if self._stoploop.is_set(): return
+        super().mainloop_hook()
+        if self.connected:
+            try:
+                if self._select(0):
+                    data = self._sock.recv(4096)
+                    if not data: raise EOFError("Connection closed by peer")
+                    self._buffer += data
+            except (OSError, EOFError, AttributeError) as e:
+                if self.connected: self.on_disconnected()
+                return
+            while self.connected and (line := self._pop_line()) is not None:
+                if line: self.on_receive_raw_data(line)
+            if self.connected: self._keepalive()
+            if self.connected: self._send_queued()
+        elif self._connecting:
+            sock, deadline = self._connecting
+            writable = self._select(0)
+            if not writable and time.monotonic() < deadline: return
+            self._selector.unregister(sock)
+            self._connecting = None
+            try:
+                if not writable: raise socket.timeout("Connection timed out")
+                self._finish_open(sock)
+            except OSError as e:
+                sock.close()
+                self.on_connect_failed(ConnectionError(e))
+                self._reconnect_later(e)
+            else: self._on_open(sock)
+        else:
+            self._select(0)
+            if time.monotonic() < self._reconnect_at: return
+            try: sock = self._start_open()
+            except OSError as e:
+                self.on_connect_failed(ConnectionError(e))
+                return self._reconnect_later(e)
+            self._selector.register(sock, selectors.EVENT_WRITE)
+            self._connecting = (sock, time.monotonic()+config.getfloat("Telnet","connect_timeout"))
 
 
 class _TelnetServer(Service):
     EVENTS = selectors.EVENT_READ | selectors.EVENT_WRITE
     
-    def __init__(self, amp, listen_host, listen_port, linebreak="\r", verbose=0):
+    def __init__(self, amp, listen_host, listen_port, linebreak="\r", verbose=0, rate_limit=0):
+        """ @rate_limit: Drop commands that arrive within @rate_limit seconds after the previous one """
         self._send = {}
+        self._last_command = 0
+        self.rate_limit = rate_limit
         self.verbose = verbose
         self.amp = amp
         self._break = linebreak
@@ -114,10 +396,19 @@ class _TelnetServer(Service):
         if conn not in self._send: self._send[conn] = b""
         return super().connection(conn, mask)
 
+    def close(self, conn):
+        self._send.pop(conn, None)
+        super().close(conn)
+
     def read(self, data):
         try: decoded = data.strip().decode()
         except: return print(traceback.format_exc())
         for data in decoded.replace("\n","\r").split("\r"):
+            now = time.monotonic()
+            if now < self._last_command+self.rate_limit:
+                if self.verbose >= 1: print("%s $ %s (dropped)"%(self.amp.prompt,data))
+                continue
+            self._last_command = now
             if self.verbose >= 1: print("%s $ %s"%(self.amp.prompt,data))
             try: self.amp.on_receive_raw_data(data)
             except Exception as e: print(traceback.format_exc())
@@ -140,9 +431,10 @@ class _TelnetServer(Service):
 class TelnetServer(AbstractServer):
     _server = None
     
-    def __init__(self, listen_host, listen_port, linebreak="\r", *args, verbose=0, **xargs):
+    def __init__(self, listen_host, listen_port, linebreak="\r", *args, verbose=0, rate_limit=0, **xargs):
         super().__init__(*args, verbose=min(0, verbose-1), **xargs)
-        self._server = _TelnetServer(self, listen_host, listen_port, linebreak, verbose=verbose)
+        self._server = _TelnetServer(
+            self, listen_host, listen_port, linebreak, verbose=verbose, rate_limit=rate_limit)
     
     host = property(lambda self: self._server.sock.getsockname()[0])
     port = property(lambda self: self._server.sock.getsockname()[1])
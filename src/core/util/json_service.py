@@ -1,36 +1,52 @@
 """
 The JsonService can be used for interprocess communication. It receives dicts.
-The function "send" sends dicts.
+The function "send" and the class Client send dicts.
+Messages are newline separated Json objects.
 """
 
-import selectors, socket, json, sys
-from threading import Thread
+import selectors, socket, json, sys, os
+from contextlib import suppress
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
 
 
 PORT=654321
 
 
+def encode(obj): return ("%s\n"%json.dumps(obj)).encode()
+
+
 class Service(object):
     """
     A service communicating with Json objects. Call mainloop() after init.
+    If @path is given, the service listens on the unix domain socket @path in addition to @host:@port.
     """
     EVENTS = selectors.EVENT_READ #| selectors.EVENT_WRITE
-    
-    def __init__(self, host="127.0.0.1", port=PORT, verbose=0):
+
+    def __init__(self, host="127.0.0.1", port=PORT, verbose=0, path=None):
         self._verbose = verbose
         self.sel = selectors.DefaultSelector()
-        sock = socket.socket()
-        self.sock = sock
-        sock.bind((host, port))
+        self.sock = socket.socket()
+        self.sock.bind((host, port))
+        self._listen(self.sock, "%s:%d"%self.sock.getsockname())
+        self.unix_sock = None
+        if path:
+            self.unix_sock = socket.socket(socket.AF_UNIX)
+            with suppress(FileNotFoundError): os.remove(path)
+            self.unix_sock.bind(path)
+            os.chmod(path, 0o600)
+            self._listen(self.unix_sock, path)
+
+    def _listen(self, sock, address):
         if self._verbose > 0: print(
-            "[%s] Listening on %s:%d"%(self.__class__.__name__,*sock.getsockname()), file=sys.stderr)
+            "[%s] Listening on %s"%(self.__class__.__name__, address), file=sys.stderr)
         sock.listen(100)
         sock.setblocking(False)
         self.sel.register(sock, selectors.EVENT_READ, self.accept)
 
     def __call__(self):
         Thread(target=self.mainloop, name=self.__class__.__name__, daemon=True).start()
-        
+
     def mainloop(self):
         while True:
             events = self.sel.select()
@@ -42,21 +58,47 @@ class Service(object):
         conn, addr = sock.accept()
         conn.setblocking(False)
         self.sel.register(conn, self.EVENTS, self.connection)
-        
+
     def connection(self, conn, mask):
         if mask & selectors.EVENT_READ:
-            data = conn.recv(1000)
-            if data: self.read(data)
-            else:
-                self.sel.unregister(conn)
-                conn.close()
+            try: data = conn.recv(4096)
+            except ConnectionError: data = b""
+            if data: self.receive(conn, data)
+            else: return self.close(conn)
         if mask & selectors.EVENT_WRITE: self.write(conn)
 
+    def receive(self, conn, data): self.read(data)
+
+    def close(self, conn):
+        self.sel.unregister(conn)
+        conn.close()
+
     def read(self, data): pass
     def write(self, conn): pass
-    
+
 
 class JsonService(Service):
+    """ Receives newline separated Json objects. A message without trailing newline
+    is being read when the sender closes the connection. """
+    max_message_size = 65536
+
+    def __init__(self, *args, **xargs):
+        self._buffers = {}
+        super().__init__(*args, **xargs)
+
+    def receive(self, conn, data):
+        *messages, rest = (self._buffers.get(conn, b"")+data).split(b"\n")
+        if len(rest) > self.max_message_size:
+            print("[%s] Message too long."%self.__class__.__name__, file=sys.stderr)
+            rest = b""
+        self._buffers[conn] = rest
+        for message in messages:
+            if message.strip(): self.read(message)
+
+    def close(self, conn):
+        rest = self._buffers.pop(conn, b"")
+        if rest.strip(): self.read(rest)
+        super().close(conn)
 
     def read(self, data):
         try:
@@ -70,16 +112,20 @@ class JsonService(Service):
 
 
 class RemoteControlService(JsonService):
-    """ 
-    Opens a service on a port and executes calls on @obj when received 
+    """
+    Opens a service on a port and executes calls on @obj when received
     message schema: {"func": property_of_obj, "kwargs": {}}
+    Calls are being executed by a pool of @workers threads. With one worker, calls are
+    being executed in the order of arrival.
     """
 
-    def __init__(self, obj, func_whitelist=None, *args, **xargs):
+    def __init__(self, obj, func_whitelist=None, *args, workers=1, **xargs):
         self._obj = obj
         self._func_whitelist = func_whitelist
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=self._obj.__class__.__name__)
         super().__init__(*args,**xargs)
-        
+
     def on_read(self, data):
         try:
             if self._func_whitelist: assert(data["func"] in self._func_whitelist)
@@ -89,12 +135,61 @@ class RemoteControlService(JsonService):
             kwargs = data["kwargs"]
         except:
             return print("[%s] invalid message."%self.__class__.__name__, file=sys.stderr)
-        Thread(name=self._obj.__class__.__name__, target=func,kwargs=kwargs, 
-            daemon=True).start()
-            
+        self._pool.submit(self._call, func, kwargs)
+
+    def _call(self, func, kwargs):
+        try: func(**kwargs)
+        except Exception as e: print("[%s] %s"%(self.__class__.__name__, repr(e)), file=sys.stderr)
+
 
-def send(obj, port=PORT):
-    sock = socket.socket()
-    sock.connect_ex(("localhost", port))
-    sock.send(json.dumps(obj).encode())
+class Client(object):
+    """ Persistent connection to a JsonService that is being reestablished on failure """
 
+    def __init__(self, port=PORT, host="localhost", path=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._sock = None
+        self._lock = Lock()
+
+    def connect(self): self._sock = connect(self.port, self.host, self.path)
+
+    def close(self):
+        if self._sock: self._sock.close()
+        self._sock = None
+
+    def _closed_by_peer(self):
+        """ The service never answers, so a readable socket has been closed """
+        sel = selectors.DefaultSelector()
+        try:
+            sel.register(self._sock, selectors.EVENT_READ)
+            return bool(sel.select(0))
+        finally: sel.close()
+
+    def send(self, obj):
+        data = encode(obj)
+        with self._lock:
+            for retry in (False, True):
+                try:
+                    if not self._sock or self._closed_by_peer():
+                        self.close()
+                        self.connect()
+                    return self._sock.sendall(data)
+                except OSError:
+                    self.close()
+                    if retry: raise
+
+
+def connect(port=PORT, host="localhost", path=None):
+    """ returns a socket connected to a JsonService on @host:@port or on unix domain socket @path """
+    if not path: return socket.create_connection((host, port))
+    sock = socket.socket(socket.AF_UNIX)
+    try: sock.connect(path)
+    except:
+        sock.close()
+        raise
+    return sock
+
+
+def send(obj, port=PORT, path=None):
+    with connect(port, path=path) as sock: sock.sendall(encode(obj))
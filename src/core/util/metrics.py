@@ -0,0 +1,30 @@
+"""
+Simple in-process metrics
+"""
+
+from threading import Lock
+
+
+class Metric:
+    """ Counts values and keeps their sum and maximum """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def __repr__(self):
+        return "<%s count=%d mean=%.4f max=%.4f>"%(self.__class__.__name__, self.count, self.mean, self.max)
+
+    def reset(self):
+        with self._lock: self.count, self.total, self.max = 0, 0, 0
+
+    def add(self, value):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if value > self.max: self.max = value
+
+    mean = property(lambda self: self.total/self.count if self.count else 0)
+
+    def as_dict(self): return dict(count=self.count, mean=self.mean, max=self.max)
+
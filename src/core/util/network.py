@@ -1,48 +1,78 @@
-import sys, subprocess, ipaddress
-try: import nmap
-except ImportError: pass
+import sys, socket, selectors, ipaddress, errno, time
 try: import netifaces
 except ImportError: pass
 
 
+def sweep(hosts, port=23, timeout=1, max_connections=256):
+    """
+    Connect to @port on every host in @hosts without blocking and yield each host
+    as soon as it accepts the connection.
+    @timeout: seconds to wait for each host
+    @max_connections: maximum number of simultaneous connection attempts
+    """
+    hosts = iter(hosts)
+    sel = selectors.DefaultSelector()
+    pending = {} # socket: (host, deadline)
+
+    def start(host):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        err = sock.connect_ex((str(host), port))
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            return sock.close()
+        pending[sock] = (host, time.monotonic()+timeout)
+        sel.register(sock, selectors.EVENT_WRITE)
+
+    def finish(sock):
+        sel.unregister(sock)
+        del pending[sock]
+        sock.close()
+
+    try:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_connections:
+                try: start(next(hosts))
+                except StopIteration: exhausted = True
+                except OSError: pass
+            if not pending: break
+            now = time.monotonic()
+            next_deadline = min(deadline for host, deadline in pending.values())
+            for key, mask in sel.select(max(0, next_deadline-now)):
+                sock = key.fileobj
+                host = pending[sock][0]
+                accepted = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                finish(sock)
+                if accepted: yield str(host)
+            now = time.monotonic()
+            for sock, (host, deadline) in list(pending.items()):
+                if deadline <= now: finish(sock)
+    finally:
+        for sock in list(pending): finish(sock)
+        sel.close()
+
+
 class PrivateNetwork(object):
+    max_hosts = 1024 # larger networks are being scanned in the /24 around the own address
 
-    def find_hosts(self):
+    def find_hosts(self, port=23, timeout=1):
         """
-        Discover hosts in current private network. This yields hostnames
+        Discover hosts in current private network that listen on @port. This yields IPs
         """
-        for e in self.by_arp(): yield e
-        for e in self.by_nmap(): yield e
-        
-    def by_arp(self):
-        try:
-            devices = subprocess.run(
-                ["/usr/sbin/arp","-a"],stdout=subprocess.PIPE).stdout.decode().strip().split("\n")
-        except Exception as e:
-            sys.stderr.write("ERROR using arp.\n")
-            return []
-        devices = [e.split(" ",1)[0] for e in devices]
-        return devices
+        for network in self._get_private_networks():
+            if network.is_loopback: continue
+            print("Scanning %s ..."%network, file=sys.stderr)
+            for host in sweep(network.hosts(), port, timeout): yield host
 
     def _get_private_networks(self):
+        networks = []
         for iface in netifaces.interfaces():
-            for l in netifaces.ifaddresses(iface).values():
-                for d in l:
-                    try: ip = ipaddress.ip_network(
-                        "%s/%s"%(d.get("addr"),d.get("netmask")),strict=False)
-                    except Exception as e: continue
-                    if not ip.is_private: continue
-                    yield(str(ip))
-    
-    def by_nmap(self):
-        nm = nmap.PortScanner()
-        for network in self._get_private_networks():
-            if network.startswith("127."): continue
-            print("Scanning %s ..."%network)
-            nm.scan(network,"23",arguments="")
-            hosts = [hostnames["name"] 
-                for ip,d in nm.analyse_nmap_xml_scan()["scan"].items() 
-                for hostnames in d["hostnames"]
-            ]
-            for h in hosts: yield h
-
+            for d in netifaces.ifaddresses(iface).get(netifaces.AF_INET, []):
+                try: network = ipaddress.ip_network(
+                    "%s/%s"%(d.get("addr"),d.get("netmask")),strict=False)
+                except Exception as e: continue
+                if not network.is_private: continue
+                if network.num_addresses > self.max_hosts:
+                    network = ipaddress.ip_network("%s/24"%d.get("addr"), strict=False)
+                if network not in networks: networks.append(network)
+        return networks
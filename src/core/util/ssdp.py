@@ -15,6 +15,15 @@
 import socket
 import http.client
 import io
+import ipaddress
+import re
+import struct
+import time
+from threading import Thread, Lock, Event
+from urllib.parse import urlparse
+from .function_bind import Bindable
+
+GROUP = ("239.255.255.250", 1900)
 
 class SSDPResponse(object):
     class _FakeSocket(io.BytesIO):
@@ -31,27 +40,164 @@ class SSDPResponse(object):
         return "<SSDPResponse({location}, {st}, {usn})>".format(**self.__dict__)
 
 def discover(service="ssdp:all", timeout=5, retries=1, mx=3):
-    group = ("239.255.255.250", 1900)
+    group = GROUP
     message = "\r\n".join([
         'M-SEARCH * HTTP/1.1',
         'HOST: {0}:{1}',
         'MAN: "ssdp:discover"',
         'ST: {st}','MX: {mx}','',''])
-    socket.setdefaulttimeout(timeout)
     for _ in range(retries):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
-        message_bytes = message.format(*group, st=service, mx=mx).encode('utf-8')
-        sock.sendto(message_bytes, group)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as sock:
+            sock.settimeout(timeout)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            message_bytes = message.format(*group, st=service, mx=mx).encode('utf-8')
+            sock.sendto(message_bytes, group)
 
-        while True:
-            try:
-                response = SSDPResponse(sock.recv(1024))
-                yield response
-            except socket.timeout:
-                break
+            while True:
+                try:
+                    response = SSDPResponse(sock.recv(1024))
+                    yield response
+                except socket.timeout:
+                    break
 
 # Example:
 # import ssdp
 # ssdp.discover("roku:ecp")
+
+
+def _parse(data):
+    """ returns the start line and the headers with lower case keys of an SSDP message """
+    start, *lines = data.decode(errors="replace").split("\r\n\r\n",1)[0].split("\r\n")
+    headers = {}
+    for line in lines:
+        key, sep, value = line.partition(":")
+        if sep: headers[key.strip().lower()] = value.strip()
+    return start, headers
+
+
+class Device(object):
+    """ A device announced via SSDP """
+
+    def __init__(self, usn, st, location, max_age):
+        self.usn = usn
+        self.st = st
+        self.location = location
+        self.expires = time.monotonic()+max_age
+
+    host = property(lambda self: urlparse(self.location).hostname)
+
+    def __repr__(self):
+        return "<Device({location}, {st}, {usn})>".format(**self.__dict__)
+
+
+class Tracker(Bindable):
+    """
+    Keeps a table of SSDP devices up to date by listening for NOTIFY alive/byebye
+    messages and answers to one initial M-SEARCH. Entries expire after their cache-control
+    max-age. Bind to on_alive, on_change and on_byebye to be notified.
+    Example:
+        tracker = Tracker()
+        tracker.bind(on_change=lambda device, old: print(device.host))
+        tracker.start()
+        tracker.find(lambda device: "denon" in device.st.lower())
+    """
+    default_max_age = 1800
+
+    def __init__(self, group=GROUP, service="ssdp:all", mx=3):
+        self.group = group
+        self.service = service
+        self.mx = mx
+        self.devices = {} # usn: Device
+        self._lock = Lock()
+        self._stop = Event()
+        self._sock = None
+
+    port = property(lambda self: self._sock.getsockname()[1])
+
+    def start(self):
+        """ open socket and start listening in background """
+        self._sock = sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"): sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        host, port = self.group
+        if ipaddress.ip_address(host).is_multicast:
+            sock.bind(("", port))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                struct.pack("=4sl", socket.inet_aton(host), socket.INADDR_ANY))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        else: sock.bind((host, port))
+        self._stop.clear()
+        Thread(target=self.mainloop, name=self.__class__.__name__, daemon=True).start()
+        self.search()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._sock: self._sock.close()
+
+    def search(self):
+        """ send M-SEARCH. Answers will be added to the table """
+        message = "\r\n".join([
+            'M-SEARCH * HTTP/1.1',
+            'HOST: {0}:{1}',
+            'MAN: "ssdp:discover"',
+            'ST: {st}','MX: {mx}','',''])
+        try: self._sock.sendto(message.format(*self.group, st=self.service, mx=self.mx).encode(), self.group)
+        except OSError: pass
+
+    def find(self, matches=lambda device: True):
+        """ returns all known devices where matches(device) is True """
+        with self._lock: return [d for d in self.devices.values() if matches(d)]
+
+    def mainloop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                expires = min([d.expires for d in self.devices.values()], default=None)
+            try:
+                self._sock.settimeout(1 if expires is None else min(1, max(0, expires-time.monotonic())))
+                data, addr = self._sock.recvfrom(2048)
+            except socket.timeout: pass
+            except OSError: break
+            else: self.receive(data)
+            self.expire()
+
+    def receive(self, data):
+        start, headers = _parse(data)
+        usn = headers.get("usn")
+        if not usn: return
+        if start.startswith("NOTIFY") and headers.get("nts") == "ssdp:byebye": return self.remove(usn)
+        if not (start.startswith("NOTIFY") or start.startswith("HTTP/")): return
+        match = re.search(r"max-age\s*=\s*(\d+)", headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        st = headers.get("st") or headers.get("nt") or ""
+        self.add(Device(usn, st, headers.get("location"), max_age))
+
+    def add(self, device):
+        with self._lock:
+            old = self.devices.get(device.usn)
+            self.devices[device.usn] = device
+        if not old: self.on_alive(device)
+        elif old.location != device.location: self.on_change(device, old)
+
+    def remove(self, usn):
+        with self._lock: device = self.devices.pop(usn, None)
+        if device: self.on_byebye(device)
+
+    def expire(self):
+        now = time.monotonic()
+        with self._lock: expired = [d.usn for d in self.devices.values() if d.expires <= now]
+        for usn in expired: self.remove(usn)
+
+    def on_alive(self, device):
+        """ A new device has been announced """
+        pass
+
+    def on_change(self, device, old):
+        """ A known device is now announced with another location, e.g. after a DHCP change """
+        pass
+
+    def on_byebye(self, device):
+        """ A device has left or its announcement expired """
+        pass
+
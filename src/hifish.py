@@ -1,4 +1,5 @@
-import argparse, os, sys, time, re, ast, traceback, shutil
+import argparse, os, sys, time, re, ast, traceback, shutil, hashlib, marshal, tempfile
+from importlib.util import MAGIC_NUMBER
 from code import InteractiveConsole
 from threading import Thread
 from itertools import groupby
@@ -7,6 +8,7 @@ from contextlib import suppress
 from decimal import Decimal
 from . import Amp, VERSION, AUTHOR
 from .core import features
+from .core.config import CONFDIR, flush_all, install_sigterm_handler
 try: import readline
 except ImportError: pass
 
@@ -27,6 +29,7 @@ class CLI:
         
         parser.add_argument("-c", "--command", default=[], metavar="CMD", nargs="+", help='Execute commands')
         parser.add_argument('-q', '--quiet', action='store_true', default=False, help='Less output')
+        parser.add_argument('--no-cache', dest="cache", action='store_false', default=True, help='Do not read or write compiled code cache')
         parser.add_argument('--verbose', '-v', action='count', default=0, help='Verbose mode')
         self.args = parser.parse_args()
         assert(not (self.args.ret and self.args.follow))
@@ -39,6 +42,7 @@ class CLI:
         if self.args.follow: self.amp.bind(on_receive_raw_data=self.receive)
         with self.amp:
             self.compiler = Compiler(
+                cache = CodeCache() if self.args.cache else None,
                 # environment variables for hifish
                 __query__ = self.query,
                 __return__ = matches,
@@ -83,9 +87,11 @@ class CLI:
                 ("exit()","Quit")]),
             ("High level functions (protocol independent)", [
                 ("$feature", "Variable that contains amp's attribute, potentially read and writeable"),
+                ("$apply(dict(feature=value, ...))", "Set several features at once, only sending differences"),
                 ("To see a list of features, type help_features()","")]),
             ("Low level functions (protocol dependent)",
-                [("CMD or $'CMD'", "Send CMD to the amp and return answer")])
+                [("CMD or $'CMD'", "Send CMD to the amp and return answer"),
+                ("$query_many(['CMD1', 'CMD2'])", "Send several CMDs at once and return all answers")])
         ]
         tw = TextWrapper(
             initial_indent=" "*4, subsequent_indent=" "*(20+4), width=shutil.get_terminal_size().columns)
@@ -118,6 +124,7 @@ class CLI:
         print("\nConnection closed", file=sys.stderr)
         try: os.system('stty sane')
         except: pass
+        flush_all()
         os._exit(1)
 
 
@@ -201,9 +208,61 @@ class Preprocessor:
         return data
 
 
+class CodeCache:
+    """ On-disk cache for compiled hifish code, similar to __pycache__.
+    Entries are keyed by a hash of the source, filename, mode, the hifish version and the
+    Python bytecode version """
+    
+    max_entries = 500
+    tmp_prefix = ".tmp-" # files being written, skipped by prune()
+    
+    def __init__(self, path=os.path.join(CONFDIR, "hifish_cache")):
+        self.path = path
+    
+    def key(self, source, filename, mode):
+        h = hashlib.sha256()
+        for e in (VERSION.encode(), MAGIC_NUMBER, filename.encode(), mode.encode(), source.encode()):
+            h.update(e)
+            h.update(b"\0")
+        return h.hexdigest()
+    
+    def get(self, key):
+        try:
+            with open(os.path.join(self.path, key), "rb") as fp: return marshal.load(fp)
+        except (OSError, EOFError, ValueError, TypeError): return None
+    
+    def set(self, key, code):
+        tmp = None
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix=self.tmp_prefix)
+            with open(fd, "wb") as fp: marshal.dump(code, fp)
+            os.replace(tmp, os.path.join(self.path, key))
+            tmp = None
+            self.prune()
+        except (OSError, ValueError) as e: print("[%s] %s"%(self.__class__.__name__, repr(e)), file=sys.stderr)
+        finally:
+            if tmp:
+                with suppress(OSError): os.remove(tmp)
+    
+    def _mtime(self, path):
+        try: return os.stat(path).st_mtime
+        except OSError: return 0
+
+    def prune(self):
+        """ remove least recently written entries if there are more than @max_entries """
+        entries = [os.path.join(self.path, e) for e in os.listdir(self.path)
+            if not e.startswith(self.tmp_prefix)]
+        if len(entries) <= self.max_entries: return
+        entries.sort(key=self._mtime)
+        for e in entries[:len(entries)-self.max_entries]:
+            with suppress(OSError): os.remove(e)
+
+
 class Compiler(Preprocessor):
 
-    def __init__(self, **env): 
+    def __init__(self, cache=None, **env): 
+        self.cache = cache
         self.env = dict(**env, wait=time.sleep, __name__="__main__")
 
     def compile(self, source, filename, mode):
@@ -217,8 +276,18 @@ class Compiler(Preprocessor):
 
     __call__ = compile
     
+    def compile_cached(self, source, filename, mode):
+        """ like compile() but reads from and writes to self.cache """
+        if not self.cache: return self.compile(source, filename, mode)
+        key = self.cache.key(source, filename, mode)
+        code = self.cache.get(key)
+        if code is None:
+            code = self.compile(source, filename, mode)
+            self.cache.set(key, code)
+        return code
+    
     def run(self, source, filename="<input>", mode="single"):
-        exec(self(source, filename, mode), self.env)
+        exec(self.compile_cached(source, filename, mode), self.env)
         
     
 class InteractiveHifish(InteractiveConsole):
@@ -229,7 +298,11 @@ class InteractiveHifish(InteractiveConsole):
         if prompt: sys.ps1 = prompt
 
 
-main = lambda:CLI()()
+def main():
+    install_sigterm_handler()
+    CLI()()
+
+
 if __name__ == "__main__":
     main()
 
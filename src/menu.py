@@ -25,58 +25,97 @@ from kivy.uix.label import Label
 from kivy.uix.tabbedpanel import TabbedPanelItem, TabbedPanelHeader
 from kivy.uix.button import Button
 from kivy.uix.tabbedpanel import TabbedPanel
-from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.uix.dropdown import DropDown
 from kivy.uix.screenmanager import ScreenManager, Screen
 
 
-class TabPanel(ScrollView):
+class TabPanel(RecycleView):
+    """ Virtualised list of the features that match the current tab's filter.
+    Only visible rows exist and only their features are being polled. """
     config = ConfigDict("menu.json")
 
     def __init__(self, amp, tabbed_panel):
         self.tabbed_panel = tabbed_panel
         self.amp = amp
         super().__init__()
-        self.features = {}
-        self._features_stack = list(self.amp.features.items())
-        self.addFeaturesFromStack(chunksize=50, repeat=None)
+        self._widgets = {} # feature key: content widget
+        self._on_value_change = {} # feature key: callable
+        self._rows = {} # feature key: visible FeatureRow
+        self._unavailable = set() # keys of features that did not answer
+        self.update_data = Clock.create_trigger(self._update_data)
+        for f in self.amp.features.values(): f.bind(
+            on_set=lambda f=f: self.on_feature_set(f), on_unset=lambda f=f: self.on_feature_unset(f))
+        self.amp.bind(on_connect=lambda: Clock.schedule_once(lambda *_: self.poll_visible()))
         
     @property
     def header(self): return self.tabbed_panel.current_tab
 
-    def addFeaturesFromStack(self, *_, chunksize=15, repeat=.2):
-        chunk, self._features_stack = self._features_stack[:chunksize], self._features_stack[chunksize:]
-        for key, f in chunk:
-            print("adding %s"%f.name)
-            self.addFeature(key, f)
-        if repeat and self._features_stack: Clock.schedule_once(self.addFeaturesFromStack, repeat)
-
-    def addFeature(self, key, f):
+    def _update_data(self, *_):
+        filter = getattr(self.header, "filter", None)
+        if filter is None: return
+        self.data = [{"feature_key": key} for key, f in self.amp.features.items()
+            if key not in self._unavailable and f.type in self.widget_types and filter(f)]
+
+    def show_feature(self, f, row):
+        """ @row starts showing @f """
+        self._rows[f.key] = row
+        f.subscribe(row.on_value)
+        if f.isset(): self.on_value(f)
+        else: self.poll(f)
+
+    def hide_feature(self, f, row):
+        """ @row stops showing @f """
+        f.unsubscribe(row.on_value)
+        if self._rows.get(f.key) == row: del self._rows[f.key]
+
+    def poll(self, f):
         try: f.async_poll()
-        except ConnectionError: pass
-        row = FeatureRow()
-        row.ids.text.text = f.name
-        row.ids.checkbox.active = key in self.config["pinned"]
-
-        if f.type == bool: w = self.addBoolFeature(f)
-        elif f.type == str: w = self.addSelectFeature(f)
-        elif f.type == int: w = self.addIntFeature(f)
-        elif f.type == Decimal: w = self.addDecimalFeature(f)
-        else: return print("WARNING: Not implemented: Feature type '%s'"%f.type, file=sys.stderr)
-        if w: row.ids.content.add_widget(w)
-        
-        def on_checkbox(checkbox, active):
-            if active: self.config["pinned"].append(key)
-            else: self.config["pinned"].remove(key)
-            self.config.save()
-            self.update_feature_visibility(f)
-        row.ids.checkbox.bind(active=on_checkbox)
-
-        self.features[key] = row
-        f.bind(on_set=lambda: self.update_feature_visibility(f))
-        f.bind(on_unset=lambda: self.update_feature_visibility(f))
-        self.ids.layout.add_widget(row)
-        
+        except ConnectionError: return
+        Clock.schedule_once(lambda *_: self._check_available(f), self.amp.call_timeout(f)+.5)
+
+    def poll_visible(self):
+        for key in list(self._rows): self.poll(self.amp.features[key])
+
+    def _check_available(self, f):
+        if f.isset() or not self.amp.connected or f.key in self._unavailable: return
+        self._unavailable.add(f.key)
+        self.update_data()
+
+    def on_feature_set(self, f):
+        if f.key in self._unavailable:
+            self._unavailable.remove(f.key)
+            self.update_data()
+
+    def on_feature_unset(self, f):
+        if row := self._rows.get(f.key): Clock.schedule_once(lambda *_: row.update_state())
+
+    widget_types = (bool, str, int, Decimal) # features of other types are not being shown
+
+    def get_widget(self, f):
+        """ returns the content widget for @f. Widgets are being created once per feature """
+        if f.key not in self._widgets:
+            if f.type == bool: w = self.addBoolFeature(f)
+            elif f.type == str: w = self.addSelectFeature(f)
+            elif f.type == int: w = self.addIntFeature(f)
+            elif f.type == Decimal: w = self.addDecimalFeature(f)
+            else:
+                w = None
+                print("WARNING: Not implemented: Feature type '%s'"%f.type, file=sys.stderr)
+            self._widgets[f.key] = w
+        return self._widgets[f.key]
+
+    def on_value(self, f):
+        """ value of visible feature @f has changed """
+        if handler := self._on_value_change.get(f.key): handler()
+
+    def on_pin(self, f, active):
+        if active: self.config["pinned"].append(f.key)
+        else: self.config["pinned"].remove(f.key)
+        self.config.save()
+        self.update_data()
+
     def _addNumericFeature(self, f, from_widget=lambda n:n, step=None):
         panel = NumericFeature()
         if step: panel.ids.slider.step = step
@@ -138,21 +177,11 @@ class TabPanel(ScrollView):
 
         return button
 
-    def update_feature_visibility(self, f):
-        Clock.schedule_once(lambda *_,f=f: self._update_feature_visibility(f), -1)
-        
-    def _update_feature_visibility(self, f):
-        filter = getattr(self.header, "filter", None)
-        if filter is None: return
-        func = show_widget if f.isset() and filter(f) else hide_widget
-        try: func(self.features[f.key])
-        except RuntimeError: pass
-        
     def bind_widget_to_feature(self, f, widget_getter, widget_setter):
-        """ @f Feature object """
+        """ @f Feature object. The widget is being updated while it is visible """
         on_value_change, on_widget_change = bind_widget_to_value(
             f.get, f.send, widget_getter, widget_setter)
-        f.bind(on_value_change)
+        self._on_value_change[f.key] = on_value_change
         return on_widget_change
         
 
@@ -164,21 +193,54 @@ class TabHeader(TabbedPanelHeader):
         if filter: self.filter = filter
         self.bind(on_release = lambda *_: self.refresh_panel())
         
-    def refresh_panel(self):
-        for key in self.content.features.keys():
-            self.content.update_feature_visibility(self.content.amp.features[key])
-
-
-class ScrollViewLayout(StackLayout):
-
-    def __init__(self,*args,**xargs):
-        super().__init__(*args,**xargs)
-        self.bind(minimum_height=self.setter('height'))
+    def refresh_panel(self): self.content.update_data()
 
 
 class MyGrid(GridLayout): pass
 
-class FeatureRow(MyGrid): pass
+class FeatureRow(RecycleDataViewBehavior, MyGrid):
+    """ Row in TabPanel that can show any feature """
+    feature = None
+    panel = None
+
+    def __init__(self, *args, **xargs):
+        super().__init__(*args, **xargs)
+        self._setting_checkbox = False
+        self.ids.checkbox.bind(active=self.on_checkbox)
+
+    def refresh_view_attrs(self, panel, index, data):
+        f = panel.amp.features[data["feature_key"]]
+        if f is not self.feature: self.set_feature(panel, f)
+        return super().refresh_view_attrs(panel, index, data)
+
+    def set_feature(self, panel, f):
+        if self.feature: self.panel.hide_feature(self.feature, self)
+        self.panel = panel
+        self.feature = f
+        self.ids.text.text = f.name
+        self._setting_checkbox = True
+        self.ids.checkbox.active = f.key in panel.config["pinned"]
+        self._setting_checkbox = False
+        self.ids.content.clear_widgets()
+        if w := panel.get_widget(f):
+            if w.parent: w.parent.remove_widget(w)
+            self.ids.content.add_widget(w)
+        self.update_state()
+        panel.show_feature(f, self)
+
+    def update_state(self): self.ids.content.disabled = not (self.feature and self.feature.isset())
+
+    def on_value(self, value):
+        """ bound to self.feature """
+        Clock.schedule_once(lambda *_, f=self.feature: f == self.feature and self._on_value(f))
+
+    def _on_value(self, f):
+        self.update_state()
+        self.panel.on_value(f)
+
+    def on_checkbox(self, checkbox, active):
+        if self._setting_checkbox or not self.feature: return
+        self.panel.on_pin(self.feature, active)
 
 class NumericFeature(GridLayout): pass
 
@@ -307,27 +369,11 @@ class MenuScreen(_MenuScreen):
         self.tabs.add_widget(header)
         return header
 
-    def on_enter(self): self.panel.addFeaturesFromStack()
+    def on_enter(self): self.panel.update_data()
         
     def on_leave(self): self.amp.exit()
 
 
-def show_widget(w):
-    old_attrs = getattr(w,"_attrs",None)
-    if old_attrs:
-        w.height, w.size_hint_y, w.opacity, w.disabled = old_attrs
-        del w._attrs
-    
-def hide_widget(w):
-    if hasattr(w, "_attrs"): raise RuntimeError(
-        "Widget's attribute '_attrs' is occupied or widget is already hidden!")
-    w._attrs = w.height, w.size_hint_y, w.opacity, w.disabled
-    w.height = 0
-    w.size_hint_y = None
-    w.opacity = 0
-    w.disabled = True
-
-
 class App(App):
 
     def load_screen(self, *args, **xargs):
@@ -1,4 +1,4 @@
-from ..amp import AbstractAmp, discover_amp
+from ..amp import AbstractAmp, discover_amp, invalidate_cache
 from .. import Amp as Amp_
 
 
@@ -6,6 +6,9 @@ class Amp(AbstractAmp):
     protocol = "Auto"
 
     def __new__(self, *args, **xargs):
-        xargs.update(discover_amp())
-        return Amp_(*args,**xargs)
+        amp_details = discover_amp()
+        uri = "%(protocol)s://%(host)s:%(port)s"%amp_details
+        amp = Amp_(uri, "client", *args, **xargs)
+        amp.bind(on_connect_failed = lambda e: invalidate_cache(amp_details["host"]))
+        return amp
 
@@ -6,6 +6,7 @@ import sys, math
 from decimal import Decimal, InvalidOperation
 from ..amp import TelnetAmp
 from ..core import config, features
+from ..core.transport.fade import FadeMixin
 from .. import amp
 
 ZONES = 4
@@ -79,23 +80,20 @@ INPUTS = {
 
 class Amp(TelnetAmp):
     protocol = "Denon"
+    _pulse = "PW?"
     
-    def query(self, cmd, matches=None):
+    def async_query(self, cmd, matches=None, *args, **xargs):
         """
         Send command to amp
         @cmd str: function[?|param]
-        @matches callable: return received line where matches(line) is True
+        @matches callable: resolve with received line where matches(line) is True
         """
         _function = cmd.upper().replace("?","")
-        if "?" not in cmd: return self.send(_function)
-        class _Feature(SelectFeature):
-            key=None
-            function=_function
-            matches = lambda self, data: (matches(data) if matches else super().matches(data))
-        _Feature.__name__ = _function
-        return "%s%s"%(_function, _Feature(self).poll(force=True))
+        if "?" not in cmd: return self.send(_function, *args, **xargs)
+        return super().async_query("%s?"%_function,
+            matches or (lambda data: data.startswith(_function)), *args, **xargs)
     
-    def send(self, cmd): super().send(cmd.upper())
+    def send(self, cmd, *args, **xargs): super().send(cmd.upper(), *args, **xargs)
 
 
 class DenonFeature:
@@ -205,9 +203,10 @@ class LooseBoolFeature(BoolFeature):
 ######### Features implementation (see Denon CLI protocol)
 
 @Amp.add_feature
-class Volume(DecimalFeature):
+class Volume(FadeMixin, DecimalFeature):
     category = "Volume"
     function = "MV"
+    fade_step = Decimal('.5') # grid of _roundVolume
     def send(self, value, **xargs): super().send(min(max(self.min,value),self.max), **xargs)
     def matches(self, data): return data.startswith(self.function) and data[len(self.function):].isnumeric()
     
@@ -27,8 +27,8 @@ class DummyClientMixin:
     def mainloop(self):
         if not self.connected: self.connect()
     
-    def send(self, data):
-        super().send(data)
+    def send(self, data, *args, **xargs):
+        super().send(data, *args, **xargs)
         if not self.connected: raise BrokenPipeError("Not connected")
 
     def enter(self):
@@ -57,10 +57,12 @@ class TelnetEmulator(ProtocolType):
     protocol = "Telnet Emulator"
 
     @classmethod
-    def new_client(cls, protocol, port=0, *args, **xargs):
+    def new_client(cls, protocol, port=0, *args, rate_limit=0, **xargs):
+        """ @rate_limit: seconds, the server drops commands that arrive faster """
         print(protocol)
         Protocol = Amp_cls(protocol)
-        server = Protocol.new_dummyserver(listen_host="127.0.0.1", listen_port=int(port))
+        server = Protocol.new_dummyserver(
+            listen_host="127.0.0.1", listen_port=int(port), rate_limit=rate_limit)
         xargs.update(host=server.host, port=server.port)
         client = type(Protocol.__name__, (DummyTelnetClient, Protocol, Protocol.Client), {})(*args, **xargs)
         client._server = server
@@ -80,7 +82,7 @@ class PlainEmulator(ProtocolType):
         client = type("Client", (DummyClientMixin, Protocol, AbstractClient), {})(*args, **xargs)
         client._server = server
         server.bind(send = lambda data: client.on_receive_raw_data(data))
-        client.bind(send = lambda data: server.on_receive_raw_data(data))
+        client.bind(send = lambda data, *args, **xargs: server.on_receive_raw_data(data))
         return client
     
     @classmethod
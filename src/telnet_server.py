@@ -36,11 +36,12 @@ def main():
     group.add_argument('-r', '--repeat', action="store_true", help='Repeat target')
     
     parser.add_argument('-n', '--newline', action="store_const", default="\r", const="\n", help='Print \\n after each line (not native bahaviour)')
+    parser.add_argument('--rate-limit', metavar="SECONDS", type=float, default=0, help='Drop commands that arrive faster (emulation only)')
     parser.add_argument('--verbose', '-v', action='count', default=0, help='Verbose mode')
     args = parser.parse_args()
     xargs = dict(uri=args.target, listen_host=args.listen_host, listen_port=args.listen_port, linebreak=args.newline, verbose=args.verbose+1)
     if args.repeat: server = ClientRepeater(**xargs)
-    else: server = Target(role=args.role, **xargs)
+    else: server = Target(role=args.role, rate_limit=args.rate_limit, **xargs)
     with server:
         while True: server.send(input())
 
@@ -140,9 +140,8 @@ class ScalePopup(HideOnUnfocusMixin, GladeGtk):
         self.image = self.builder.get_object("image")
         self.adj = self.builder.get_object("adjustment")
         self.adj.set_page_increment(config.getdecimal("Tray","tray_scroll_delta"))
-        
-        for f in self.amp.features.values(): f.bind(
-            gtk(lambda *args, f=f, **xargs: f==self._current_feature and self.on_value_change(*args,**xargs)))
+        self._pixbufs = {}
+        self._on_feature_change = gtk(lambda *args: self.on_value_change())
 
     def set_value(self, value):
         self.scale.set_value(value)
@@ -150,7 +149,9 @@ class ScalePopup(HideOnUnfocusMixin, GladeGtk):
         
     @gtk
     def set_image(self, path):
-        self.image.set_from_file(path)
+        """ Images are being loaded once and kept in memory """
+        if path not in self._pixbufs: self._pixbufs[path] = GdkPixbuf.Pixbuf.new_from_file(path)
+        self.image.set_from_pixbuf(self._pixbufs[path])
         
     def on_change(self, event): self.on_widget_change()
     
@@ -159,6 +160,8 @@ class ScalePopup(HideOnUnfocusMixin, GladeGtk):
     
     @gtk
     def show(self, f):
+        """ show popup for feature @f. Only @f's changes are being listened to """
+        if self._current_feature: self._current_feature.unsubscribe(self._on_feature_change)
         self.on_value_change, self.on_widget_change = bind_widget_to_value(
             f.get, f.send, self.scale.get_value,
             lambda value: f==self._current_feature and self.set_value(value))
@@ -166,6 +169,7 @@ class ScalePopup(HideOnUnfocusMixin, GladeGtk):
         self.adj.set_lower(f.min)
         self.adj.set_upper(f.max)
         self._current_feature = f
+        f.subscribe(self._on_feature_change)
         self.on_value_change()
         super().show()
 
@@ -198,23 +202,20 @@ class MenuMixin:
         self.amp.bind(on_connect = gtk(item_more.show))
         self.amp.bind(on_disconnected = gtk(item_more.hide))
         submenu = Gtk.Menu()
+        self._built_categories = {}
         categories = list(dict.fromkeys([f.category for f in self.amp.features.values()]))
-        categories = {cat: {"menu":Gtk.Menu(), "item":Gtk.MenuItem(cat, no_show_all=True)}
-            for cat in categories}
-        for d in categories.values():
-            submenu.append(d["item"])
-            d["item"].set_submenu(d["menu"])
-            self.amp.bind(on_disconnected=gtk(lambda i=d["item"]: i.hide()))
-        for key, f in self.amp.features.items():
-            d = categories[f.category]
-            try: d["menu"].append(self.add_feature(f, False))
-            except RuntimeError: pass
-            else: f.bind(on_set = gtk(lambda i=d["item"]: i.show()))
-        def poll_all():
-            try:
-                for f in self.amp.features.values(): f.async_poll()
-            except ConnectionError: pass
-        self.amp.bind(on_connect=lambda:Timer(1, poll_all).start())
+        for category in categories:
+            item = Gtk.MenuItem(category, no_show_all=True)
+            item.set_submenu(Gtk.Menu())
+            submenu.append(item)
+            # build on first opening. Which signal arrives depends on the indicator implementation
+            build = lambda *args, category=category, item=item: self._build_category(category, item)
+            item.connect("select", build)
+            item.connect("activate", build)
+            item.get_submenu().connect("map", build)
+            self.amp.bind(on_connect=gtk(item.show))
+            self.amp.bind(on_disconnected=gtk(item.hide))
+        self.amp.bind(on_connect=lambda:Timer(1, self._poll_built_categories).start())
         item_more.set_submenu(submenu)
         menu.append(item_more)
 
@@ -245,6 +246,24 @@ class MenuMixin:
         menu.show_all()
         return menu
     
+    def _build_category(self, category, item):
+        """ fill submenu of @item with the features of @category and poll them """
+        if category in self._built_categories: return
+        features_ = [f for f in self.amp.features.values() if f.category == category]
+        self._built_categories[category] = features_
+        for f in features_:
+            try: item.get_submenu().append(self.add_feature(f, False))
+            except RuntimeError: pass
+        self._poll(features_)
+
+    def _poll_built_categories(self):
+        self._poll([f for features_ in list(self._built_categories.values()) for f in features_])
+
+    def _poll(self, features_):
+        try:
+            for f in features_: f.async_poll()
+        except ConnectionError: pass
+
     def add_feature(self, f, compact=True):
         """ compact: If true, SelectFeatures show the value in the label.
         and BoolFeatures are Checkboxes without submenus. """
@@ -1,19 +1,92 @@
 # -*- coding: utf-8 -*-
-import time, sys, tempfile, os
-from threading import Thread, Lock
+import time, sys, tempfile, os, socket
+from threading import Thread, Lock, Event
 from contextlib import suppress
 from ..core.util import json_service
 from ..core import features, config
+from ..core.config import CONFDIR
 from ..info import PKG_NAME
 
 
 ipc_port_file = os.path.join(tempfile.gettempdir(), "%s.port"%PKG_NAME)
+ipc_socket_file = os.path.join(CONFDIR, "ipc.sock")
+
+
+class VolumeRamp:
+    """
+    Volume controller that keeps a local target value. Only the newest target is being sent,
+    the next one as soon as the amp echoed the previous one or after @interval seconds.
+    Volume changes from elsewhere become the new base while nothing is pending.
+    The target stays within @max_lead of the amp's last echoed volume.
+    """
+    max_lead = 3
+
+    def __init__(self, amp, interval=.03):
+        self.amp = amp
+        self.interval = interval
+        self._target = None
+        self._sent = None # value sent and not yet echoed
+        self._sent_time = 0
+        self._lock = Lock()
+        self._wake = Event()
+        self.amp.bind(on_feature_change = self.on_feature_change, on_disconnected = self.reset)
+        Thread(target=self.mainloop, daemon=True, name=self.__class__.__name__).start()
+
+    feature = property(lambda self: self.amp.features[config.volume])
+
+    def reset(self):
+        with self._lock: self._target = self._sent = None
+
+    def step(self, delta):
+        """ move target by @delta relative to the current target or to the amp's volume """
+        f = self.feature
+        current = f.get()
+        with self._lock:
+            base = current if self._target is None else self._target
+            target = max(current-self.max_lead, min(current+self.max_lead, base+delta))
+            self._target = max(f.min, min(f.max, f.type(target)))
+        self._wake.set()
+
+    def set(self, value):
+        with self._lock: self._target = self.feature.type(value)
+        self._wake.set()
+
+    def on_feature_change(self, key, value, *args): # bound to amp
+        if key != config.volume: return
+        with self._lock:
+            if self._sent is not None:
+                if self._target == self._sent or self._target == value: self._target = None
+                self._sent = None
+            elif self._target == value: self._target = None
+            elif self._target is not None and time.monotonic() > self._sent_time+self.interval:
+                self._target = None # changed by someone else
+        self._wake.set()
+
+    def mainloop(self):
+        timeout = None
+        while True:
+            self._wake.wait(timeout)
+            self._wake.clear()
+            timeout = None
+            with self._lock:
+                target = self._target
+                if target is None or target == self._sent: continue
+                wait = self._sent_time+self.interval-time.monotonic()
+                if self._sent is not None and wait > 0:
+                    timeout = wait
+                    continue
+                self._sent = target
+                self._sent_time = time.monotonic()
+            try: self.feature.send(target, force=True)
+            except ConnectionError: self.reset()
 
 
 class VolumeChanger:
     """ 
     Class for managing volume up/down while hot key pressed
-    when both hot keys are being pressed, last one counts
+    when both hot keys are being pressed, last one counts.
+    While a key is being held, the volume moves by @speed units per second in steps of @step.
+    The speed grows by @acceleration units per second² up to @max_speed.
     
     Example 1:
         button1=True
@@ -32,41 +105,48 @@ class VolumeChanger:
         super().__init__(*args, **xargs)
         self.interval = config.getfloat("MouseBinding","interval")/1000
         self.step = config.getdecimal("MouseBinding","step")
+        self.speed = config.getfloat("MouseBinding","speed")
+        self.max_speed = config.getfloat("MouseBinding","max_speed")
+        self.acceleration = config.getfloat("MouseBinding","acceleration")
         self.button = None
-        self._volume_step = Lock()
-        self._volume_step.acquire()
+        self._pressed = Event()
+        self.volume_ramp = VolumeRamp(self.amp, self.interval)
         self.amp.preload_features.add(config.volume)
-        self.amp.bind(on_feature_change = self.on_feature_change)
         Thread(target=self.volume_thread, daemon=True, name="key_binding").start()
     
     def on_key_press(self, button):
         """ start sending volume events to amp """
         self.keys_pressed += 1
         self.button = button
-        with suppress(RuntimeError): self._volume_step.release()
+        self._pressed.set()
 
     def on_key_release(self, button):
         """ button released """
         self.keys_pressed -= 1
         if self.keys_pressed > 0: self.button = not button
-        with suppress(RuntimeError): self._volume_step.release()
+        else: self._pressed.clear()
         Thread(target=self.poweron, args=(True,), name="poweron", daemon=True).start()
 
     def volume_thread(self):
         while True:
-            self._volume_step.acquire() # wait for on_feature_change
-            self.step_volume()
-    
-    @features.require(config.volume)
-    def step_volume(self):
-        if self.keys_pressed > 0:
-            setattr(self.amp,config.volume,
-                getattr(self.amp,config.volume) + self.step*(int(self.button)*2-1))
-            if self.interval: time.sleep(self.interval)
+            self._pressed.wait()
+            start = last = time.monotonic()
+            distance = float(self.step) # first step immediately
+            while self.keys_pressed > 0:
+                steps = int(distance/float(self.step))
+                if steps:
+                    distance -= steps*float(self.step)
+                    with suppress(ConnectionError, AttributeError):
+                        self.volume_ramp.step(self.step*steps*(int(self.button)*2-1))
+                time.sleep(max(self.interval, .01))
+                now = time.monotonic()
+                speed = min(self.max_speed, self.speed+self.acceleration*(now-start))
+                distance += speed*(now-last)
+                last = now
 
-    def on_feature_change(self, key, value, *args): # amp change
-        if key != config.volume or self.keys_pressed <= 0: return
-        with suppress(RuntimeError): self._volume_step.release()
+
+def _unix_transport():
+    return hasattr(socket, "AF_UNIX") and config.get("Service","ipc_transport") == "unix"
 
 
 def RemoteControlService(*args,**xargs):
@@ -75,8 +155,8 @@ def RemoteControlService(*args,**xargs):
     secure_mode = config.getboolean("Service","secure_mode")
     if not secure_mode: print("[WARNING] Service not running in secure mode", file=sys.stderr)
     whitelist = ("on_key_press","on_key_release") if secure_mode else None
-    rcs = json_service.RemoteControlService(
-        *args,port=ipc_port,func_whitelist=whitelist,**xargs)
+    rcs = json_service.RemoteControlService(*args, port=ipc_port,
+        path=ipc_socket_file if _unix_transport() else None, func_whitelist=whitelist, **xargs)
     ipc_port = rcs.sock.getsockname()[1]
     with suppress(Exception):
         with open(ipc_port_file, "w") as fp: fp.write(str(ipc_port))
@@ -84,7 +164,22 @@ def RemoteControlService(*args,**xargs):
     return rcs
 
 
+def _read_port():
+    with open(ipc_port_file) as fp: return int(fp.read().strip())
+
+
 def send(e):
-    with open(ipc_port_file) as fp: ipc_port = int(fp.read().strip())
-    return json_service.send(e, port=ipc_port)
+    if _unix_transport(): return json_service.send(e, path=ipc_socket_file)
+    return json_service.send(e, port=_read_port())
+
+
+class Client(json_service.Client):
+    """ Persistent connection to the RemoteControlService. The port is being read on each connect """
+
+    def __init__(self): super().__init__(port=None)
+
+    def connect(self):
+        if _unix_transport(): self.path = ipc_socket_file
+        else: self.port = _read_port()
+        super().connect()
 
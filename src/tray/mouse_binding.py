@@ -1,5 +1,6 @@
+import sys
 from pynput.mouse import Listener, Button, Controller
-from ..tray.key_binding import send
+from ..tray.key_binding import Client
 from ..core.config import config
 
 
@@ -9,12 +10,15 @@ VOLDOWN = getattr(Button,config["MouseBinding"]["vol_down"])
 
 class Main(object):
 
+    def __init__(self): self.client = Client()
+
     def on_click(self, x, y, button, pressed):
         if button not in (VOLUP, VOLDOWN):
             return
         button = button == VOLUP # to bool
         func = {True:"on_key_press",False:"on_key_release"}[pressed]
-        send(dict(kwargs=dict(button=button), func=func))
+        try: self.client.send(dict(kwargs=dict(button=button), func=func))
+        except OSError as e: print("[%s] %s"%(self.__class__.__name__, repr(e)), file=sys.stderr)
             
     def __call__(self):
         print("WARNING: Mouse events that control the amp are not being suppressed to other programs.")
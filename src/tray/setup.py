@@ -32,6 +32,14 @@ def source_setup():
     config.setlist("Amp", "source", [source])
 
 
+def _remove_xbindkeys_block(content):
+    """ removes the bindings that have been written by setup_xorg_key_binding() from @content """
+    content = re.sub(r"^## HIFICON SETTINGS\n.*?^## END HIFICON SETTINGS\n?", "", content, flags=re.M|re.S)
+    # older versions wrote no end marker: remove the following entries that call hificon
+    return re.sub(r'^## HIFICON SETTINGS\n(?:[ \t]*\n|"[^\n]*%s[^\n]*"\n[^"\n]*\n?)*'%PKG_NAME,
+        "", content, flags=re.M)
+
+
 def setup_xorg_key_binding():
     if sys.platform != "linux": return
     if input("Bind mouse keys to volume and modify ~/.xbindkeysrc? [Y/n] ") == "n": return
@@ -39,8 +47,9 @@ def setup_xorg_key_binding():
     if not os.path.exists(xbindkeysrc):
         os.system("xbindkeys -d > %s"%xbindkeysrc)
     content = pkgutil.get_data(__name__,"../share/xbindkeysrc").decode()
-    with open(xbindkeysrc,"a+") as fp:
-        fp.write("\n%s"%content)
+    with open(xbindkeysrc) as fp: old = _remove_xbindkeys_block(fp.read()).rstrip("\n")
+    with open(xbindkeysrc,"w") as fp:
+        fp.write("%s\n\n%s"%(old, content) if old else content)
     print("Written to %s."%xbindkeysrc)
     print("Restarting xbindkeys...")
     os.system("killall xbindkeys")
@@ -65,7 +74,7 @@ def zone_setup():
 def discover_amp_prompt():
     def set_amp(host,port,protocol,**xargs):
         config["Target"]["uri"] = f"{protocol}://{host}:{port}"
-    try: amp_details = discover_amp()
+    try: amp_details = discover_amp(cache=False)
     except Exception as e:
         print("%s: %s"%(type(e).__name__, e))
         while True:
@@ -1,9 +1,10 @@
-import sys, math, pkgutil, os, tempfile
-from threading import Thread, Timer
+import sys, math, pkgutil, os, tempfile, shutil, time
+from collections import OrderedDict, deque
+from threading import Thread, Timer, Lock
 from .. import Amp
 from ..core import features
 from ..core.util import Bindable
-from ..core.config import config, ConfigDict
+from ..core.config import config, ConfigDict, install_sigterm_handler
 from ..amp import AmpController
 from . import gui
 from .key_binding import RemoteControlService, VolumeChanger
@@ -57,7 +58,10 @@ class NumericNotification(FeatureNotification):
         
 
 class Icon(Bindable):
-    """ Functions regarding loading images from src/share """
+    """ Functions regarding loading images from src/share.
+    All icons are being extracted once on enter, so that switching icons needs no file I/O """
+    icons = ("audio-volume-low", "audio-volume-medium", "audio-volume-high",
+        "audio-volume-muted", "power", "disconnected")
     
     def __init__(self, amp):
         self.amp = amp
@@ -89,45 +93,83 @@ class Icon(Bindable):
     def set_icon(self, name="disconnected"):
         if self._icon_name == name: return
         self._icon_name = name
-        image_data = pkgutil.get_data(__name__, f"../share/icons/scalable/{name}.svg")
-        with open(self._path, "wb") as fp: fp.write(image_data)
-        self.on_change(self._path, name)
+        self.on_change(self._paths[name], name)
 
     def on_change(self, path, name): pass
     
     def __enter__(self):
-        self._path = tempfile.mktemp()
+        self._dir = tempfile.mkdtemp()
+        self._paths = {}
+        for name in self.icons:
+            self._paths[name] = os.path.join(self._dir, f"{name}.svg")
+            with open(self._paths[name], "wb") as fp:
+                fp.write(pkgutil.get_data(__name__, f"../share/icons/scalable/{name}.svg"))
         return self
     
-    def __exit__(self, *args):
-        try: os.remove(self._path)
-        except FileNotFoundError: pass
+    def __exit__(self, *args): shutil.rmtree(self._dir, ignore_errors=True)
 
 
 class NotificationMixin(object):
-    """ Does the graphical notifications """
+    """ Does the graphical notifications. Notifications are being created in the GTK thread when first shown.
+    Only the @max_notifications most recently used ones are being kept and
+    at most @notification_burst different features are being shown per @notification_burst_window seconds """
+    max_notifications = 8
+    notification_burst = 3
+    notification_burst_window = 1
 
     def __init__(self,*args,**xargs):
         super().__init__(*args,**xargs)
-        notification_whitelist = config.getlist("Tray","notification_whitelist")
-        notification_blacklist = config.getlist("Tray","notification_blacklist")
-        create_notification = lambda f: \
-            NumericNotification(f) if isinstance(f, features.NumericFeature) else TextNotification(f)
-        self._notifications = {key:create_notification(f) for key,f in list(self.amp.features.items())
-            if f.key not in notification_blacklist
-            and ("*" in notification_whitelist or self.f.key in notification_whitelist)}
-        self.amp.preload_features.add(config.volume)
+        whitelist = set(config.getlist("Tray","notification_whitelist"))
+        blacklist = set(config.getlist("Tray","notification_blacklist"))
+        self._notify_features = {key for key in self.amp.features.keys()
+            if key not in blacklist and ("*" in whitelist or key in whitelist)}
+        self._notifications = OrderedDict()
+        self._shown = deque() # (time, key)
+        self._notifications_lock = Lock()
+        gui.GaugeNotification() # shared by all numeric notifications, build it in the GTK thread
+        self.amp.preload_features.update((config.volume, "name"))
         self.amp.bind(on_feature_change = self.show_notification_on_feature_change)
-    
-    def show_notification(self, key): key in self._notifications and self._notifications[key].show()
+
+    def get_notification(self, key):
+        """ returns the notification for feature @key or None if it shall not be notified.
+        Call in GTK thread """
+        if key not in self._notify_features: return
+        if key in self._notifications: self._notifications.move_to_end(key)
+        else:
+            f = self.amp.features[key]
+            self._notifications[key] = \
+                NumericNotification(f) if isinstance(f, features.NumericFeature) else TextNotification(f)
+            if len(self._notifications) > self.max_notifications: self._notifications.popitem(last=False)
+        return self._notifications[key]
+
+    def _may_show(self, key):
+        now = time.monotonic()
+        while self._shown and self._shown[0][0] < now-self.notification_burst_window:
+            self._shown.popleft()
+        keys = {k for t, k in self._shown}
+        if key not in keys and len(keys) >= self.notification_burst: return False
+        self._shown.append((now, key))
+        return True
+
+    def show_notification(self, key):
+        if key not in self._notify_features: return
+        with self._notifications_lock:
+            if not self._may_show(key): return
+        self._show_notification(key)
+
+    @gui.gtk
+    def _show_notification(self, key):
+        n = self.get_notification(key)
+        n.update()
+        n.show()
     
     def on_key_press(self,*args,**xargs):
         self.show_notification(config.volume)
         super().on_key_press(*args,**xargs)
 
     def show_notification_on_feature_change(self, key, value, prev): # bound to amp
-        if key in self._notifications: self._notifications[key].update()
         if prev is not None: self.show_notification(key)
+        elif n := self._notifications.get(key): n.update()
 
     def on_scroll_up(self, *args, **xargs):
         self.show_notification(config.volume)
@@ -154,14 +196,10 @@ class TrayMixin(gui.Tray):
         self.set_icon(path, name)
     
     @features.require(config.volume)
-    def on_scroll_up(self, steps):
-        new_volume = getattr(self.amp,config.volume)+self.scroll_delta*steps
-        setattr(self.amp, config.volume, new_volume)
+    def on_scroll_up(self, steps): self.volume_ramp.step(self.scroll_delta*steps)
 
     @features.require(config.volume)
-    def on_scroll_down(self, steps):
-        new_volume = getattr(self.amp,config.volume)-self.scroll_delta*steps
-        setattr(self.amp, config.volume, new_volume)
+    def on_scroll_down(self, steps): self.volume_ramp.step(-self.scroll_delta*steps)
     
     def poweron(self, force=False):
         """ poweron amp """
@@ -214,6 +252,7 @@ def main(args):
     amp = Amp(args.target, connect=False, verbose=args.verbose+1)
     with Icon(amp) as icon:
         app = Main(amp, icon=icon, verbose=args.verbose+1)
+        install_sigterm_handler() # after SystemEvents has set its handler
         with amp:
             if rcs := RemoteControlService(app,verbose=args.verbose): rcs()
             app.mainloop()
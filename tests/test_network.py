@@ -0,0 +1,36 @@
+import socket, time, unittest
+from hificon.core.util.network import sweep
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.listeners = []
+        for host in ("127.0.0.1", "127.0.0.2"):
+            sock = socket.socket()
+            sock.bind((host, self.listeners[0].getsockname()[1] if self.listeners else 0))
+            sock.listen()
+            self.listeners.append(sock)
+        self.port = self.listeners[0].getsockname()[1]
+
+    def tearDown(self):
+        for sock in self.listeners: sock.close()
+
+    def test_finds_listeners(self):
+        hosts = ["127.0.0.1", "127.0.0.3", "127.0.0.2", "127.0.0.4"]
+        self.assertEqual(sorted(sweep(hosts, self.port, timeout=1)), ["127.0.0.1", "127.0.0.2"])
+
+    def test_refused_ports_do_not_wait_for_timeout(self):
+        start = time.monotonic()
+        found = list(sweep(["127.0.0.%d"%i for i in range(3, 20)], self.port, timeout=5))
+        self.assertEqual(found, [])
+        self.assertLess(time.monotonic()-start, 2)
+
+    def test_max_connections(self):
+        hosts = ["127.0.0.%d"%i for i in range(1, 10)]
+        self.assertEqual(sorted(sweep(hosts, self.port, timeout=1, max_connections=2)),
+            ["127.0.0.1", "127.0.0.2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import time, unittest
+from hificon import Amp
+from hificon.core.transport.pacing import Pacer
+
+
+class TestPacer(unittest.TestCase):
+
+    def test_drop_doubles_gap(self):
+        pacer = Pacer(min_gap=.01, max_gap=1, deadline=.05, gap=.01)
+        pacer.min_deadline = .05
+        pacer.on_send("MV?")
+        pacer.on_receive("MV50")
+        pacer.on_send("MV?")
+        time.sleep(.06)
+        pacer.check()
+        self.assertEqual(pacer.dropped, 1)
+        self.assertAlmostEqual(pacer.gap, .02)
+
+    def test_shrinks_after_clean_run(self):
+        pacer = Pacer(min_gap=.01, max_gap=1, gap=.1)
+        for i in range(pacer.clean_run-1):
+            pacer.on_send("MV?")
+            pacer.on_receive("MV50")
+        self.assertAlmostEqual(pacer.gap, .1)
+        pacer.on_send("MV?")
+        pacer.on_receive("MV50")
+        self.assertAlmostEqual(pacer.gap, .1*pacer.decrease)
+
+    def test_answer_matches_command(self):
+        pacer = Pacer()
+        pacer.on_send("PSBAS ?")
+        pacer.on_send("PSTRE ?")
+        pacer.on_receive("PSTRE 50")
+        self.assertEqual([stem for stem, sent, query in pacer._outstanding], ["PSBAS"])
+
+    def test_unanswered_query_is_no_drop(self):
+        """ amps do not answer queries for unsupported features """
+        pacer = Pacer(min_gap=.01, max_gap=1, deadline=.05, gap=.01)
+        pacer.min_deadline = .05
+        for i in range(3): pacer.on_send("XXX?")
+        time.sleep(.06)
+        pacer.check()
+        self.assertEqual(pacer.dropped, 0)
+        self.assertAlmostEqual(pacer.gap, .01)
+
+
+class TestRateLimitedEmulator(unittest.TestCase):
+    """ The emulator drops commands that arrive within 50 ms after the previous one """
+
+    def test_adapts_to_rate_limit(self):
+        with Amp(".emulator:.denon", rate_limit=.05) as amp:
+            calls = sorted({f.call for f in amp.features.values() if f.call})[:20]
+            for call in calls: # let the pacer learn which commands are being answered
+                amp.send(call)
+                time.sleep(.06)
+            time.sleep(.2)
+            dropped = []
+            for burst in range(6):
+                before = amp._pacer.dropped
+                for call in calls: amp.send(call)
+                amp._scheduler.flush()
+                time.sleep(amp._pacer.drop_deadline()+.2)
+                amp._pacer.check()
+                dropped.append(amp._pacer.dropped-before)
+            self.assertGreater(dropped[0], 0)
+            self.assertLessEqual(sum(dropped[-3:]), 3)
+            self.assertGreaterEqual(amp._pacer.gap, .03)
+
+
+    def test_unanswered_polls(self):
+        with Amp(".emulator:.denon") as amp:
+            for burst in range(5):
+                for i in range(3): amp.send("XXX?")
+                amp._scheduler.flush()
+                time.sleep(amp._pacer.drop_deadline()+.1)
+                amp._pacer.check()
+            self.assertEqual(amp._pacer.dropped, 0)
+            start = time.monotonic()
+            for i in range(20): amp.send("MV?")
+            amp._scheduler.flush()
+            self.assertLess(time.monotonic()-start, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import socket, unittest
+from queue import Queue
+from hificon.core.util.ssdp import Tracker
+
+
+def notify(usn, nts="ssdp:alive", location="http://192.168.0.2:8080/description.xml", max_age=1800):
+    return "\r\n".join([
+        "NOTIFY * HTTP/1.1",
+        "HOST: 239.255.255.250:1900",
+        "CACHE-CONTROL: max-age=%d"%max_age,
+        "LOCATION: %s"%location,
+        "NT: urn:schemas-denon-com:device:ACT-Denon:1",
+        "NTS: %s"%nts,
+        "USN: %s"%usn, "", ""]).encode()
+
+
+class TestTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.events = Queue()
+        self.tracker = Tracker(group=("127.0.0.1", 0))
+        self.tracker.bind(
+            on_alive = lambda device: self.events.put(("alive", device)),
+            on_change = lambda device, old: self.events.put(("change", device)),
+            on_byebye = lambda device: self.events.put(("byebye", device)))
+        self.tracker.start()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def tearDown(self):
+        self.sock.close()
+        self.tracker.stop()
+
+    def send(self, data): self.sock.sendto(data, ("127.0.0.1", self.tracker.port))
+
+    def event(self, timeout=3): return self.events.get(timeout=timeout)
+
+    def test_alive_change_byebye(self):
+        self.send(notify("uuid:amp"))
+        event, device = self.event()
+        self.assertEqual(event, "alive")
+        self.assertEqual(device.host, "192.168.0.2")
+        self.send(notify("uuid:amp"))
+        self.send(notify("uuid:amp", location="http://192.168.0.3:8080/description.xml"))
+        event, device = self.event()
+        self.assertEqual(event, "change")
+        self.assertEqual(device.host, "192.168.0.3")
+        self.send(notify("uuid:amp", nts="ssdp:byebye"))
+        event, device = self.event()
+        self.assertEqual(event, "byebye")
+        self.assertEqual(self.tracker.find(), [])
+        self.assertTrue(self.events.empty())
+
+    def test_max_age_expiry(self):
+        self.send(notify("uuid:amp", max_age=1))
+        self.assertEqual(self.event()[0], "alive")
+        self.assertEqual(len(self.tracker.find()), 1)
+        event, device = self.event()
+        self.assertEqual(event, "byebye")
+        self.assertEqual(device.usn, "uuid:amp")
+        self.assertEqual(self.tracker.find(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()